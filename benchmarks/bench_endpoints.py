@@ -0,0 +1,311 @@
+"""
+Load test of auth and users endpoints.
+
+Seeds users, drives concurrent clients against every endpoint
+and reports p50/p95/p99 latency and requests per second.
+Runs in-process through ASGI transport or against running server
+with --base-url. Results can be saved as baseline and compared
+with it to catch regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+root_path = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, (root_path / "src").as_posix())
+
+# Benchmark logs in many times from one address
+os.environ.setdefault("RATE_LIMIT__ENABLED", "false")
+
+from httpx import ASGITransport, AsyncClient  # noqa:E402
+from sqlalchemy import delete, insert, select  # noqa:E402
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # noqa:E402
+
+from auth.schemas import pwd_context  # noqa:E402
+from core.fastapi_factory import create_app  # noqa:E402
+from dao.models import Password, Role, User  # noqa:E402
+from database.database import async_session  # noqa:E402
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+SEED_EMAIL_TEMPLATE = "bench-{}@example.com"
+NEW_USER_EMAIL_PREFIX = "bench-new-"
+BENCH_PASSWORD = "bench-password"
+
+RequestFunc = Callable[[AsyncClient], Awaitable[int]]
+
+
+async def seed_users(users_count: int) -> None:
+    """Insert users which are not in database yet, all with one password"""
+
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+    emails = [SEED_EMAIL_TEMPLATE.format(number) for number in range(users_count)]
+    async with async_session() as session:
+        result = await session.execute(
+            select(User.email).where(User.email.in_(emails)),
+        )
+        existing_emails = set(result.scalars().all())
+        new_emails = [email for email in emails if email not in existing_emails]
+        if not new_emails:
+            return
+        password_ids = await session.scalars(
+            insert(Password).returning(Password.id, sort_by_parameter_order=True),
+            [{"hashed_password": hashed_password} for _ in new_emails],
+        )
+        await session.execute(
+            pg_insert(User).on_conflict_do_nothing(index_elements=[User.email]),
+            [
+                {
+                    "username": email.split("@")[0],
+                    "email": email,
+                    "roles": [Role.user],
+                    "password_id": password_id,
+                }
+                for email, password_id in zip(new_emails, password_ids.all())
+            ],
+        )
+        await session.commit()
+
+
+async def drop_created_users() -> None:
+    """Delete users created by POST /api/users benchmark"""
+
+    async with async_session() as session:
+        await session.execute(
+            delete(Password).where(
+                Password.id.in_(
+                    select(User.password_id).where(
+                        User.email.startswith(NEW_USER_EMAIL_PREFIX),
+                    )
+                )
+            )
+        )
+        await session.commit()
+
+
+async def login(client: AsyncClient, email: str, password: str) -> str:
+    response = await client.post(
+        "/token",
+        data={"grant_type": "password", "username": email, "password": password},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def make_requests(
+    admin_token: str,
+    user_token: str,
+    admin_email: str,
+    admin_password: str,
+) -> dict[str, RequestFunc]:
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+
+    async def create_token(client: AsyncClient) -> int:
+        response = await client.post(
+            "/token",
+            data={
+                "grant_type": "password",
+                "username": admin_email,
+                "password": admin_password,
+            },
+        )
+        return response.status_code
+
+    async def get_me(client: AsyncClient) -> int:
+        response = await client.get("/api/users/me", headers=user_headers)
+        return response.status_code
+
+    async def get_users(client: AsyncClient) -> int:
+        response = await client.get("/api/users", headers=user_headers)
+        return response.status_code
+
+    async def add_user(client: AsyncClient) -> int:
+        response = await client.post(
+            "/api/users",
+            json={
+                "username": "bench",
+                "email": f"{NEW_USER_EMAIL_PREFIX}{uuid.uuid4().hex}@example.com",
+                "roles": ["user"],
+                "password": BENCH_PASSWORD,
+            },
+            headers=admin_headers,
+        )
+        return response.status_code
+
+    return {
+        "POST /token": create_token,
+        "GET /api/users/me": get_me,
+        "GET /api/users": get_users,
+        "POST /api/users": add_user,
+    }
+
+
+async def run_endpoint(
+    client: AsyncClient,
+    request: RequestFunc,
+    requests_count: int,
+    concurrency: int,
+) -> dict[str, float]:
+    """Send requests_count requests with concurrency clients"""
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests_count))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            started_at = time.perf_counter()
+            status_code = await request(client)
+            latencies.append(time.perf_counter() - started_at)
+            if status_code >= 400:
+                errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "rps": round(requests_count / elapsed, 2),
+        "errors": errors,
+    }
+
+
+def print_report(
+    report: dict[str, dict[str, float]],
+    baseline: Optional[dict[str, dict[str, float]]],
+) -> None:
+    print(
+        f"{'endpoint':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'req/s':>10}{'errors':>8}{'base p95':>10}{'base rps':>10}"
+    )
+    for endpoint, stats in report.items():
+        base = (baseline or {}).get(endpoint, {})
+        print(
+            f"{endpoint:<20}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+            f"{stats['p99_ms']:>10}{stats['rps']:>10}{stats['errors']:>8}"
+            f"{base.get('p95_ms', '-'):>10}{base.get('rps', '-'):>10}"
+        )
+
+
+def find_regressions(
+    report: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    """Compare p95 latency and throughput with baseline"""
+
+    regressions = []
+    for endpoint, stats in report.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{endpoint}: p95 {stats['p95_ms']} ms > {base['p95_ms']} ms"
+            )
+        if stats["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: {stats['rps']} req/s < {base['rps']}")
+        if stats["errors"]:
+            regressions.append(f"{endpoint}: {stats['errors']} errors")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    async with AsyncExitStack() as stack:
+        if args.base_url:
+            client = AsyncClient(base_url=args.base_url)
+        else:
+            app = create_app()
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = AsyncClient(
+                transport=ASGITransport(app=app),
+                base_url="http://bench",
+            )
+        await stack.enter_async_context(client)
+
+        await seed_users(args.users)
+        admin_token = await login(client, args.admin_email, args.admin_password)
+        user_token = await login(
+            client,
+            SEED_EMAIL_TEMPLATE.format(0),
+            BENCH_PASSWORD,
+        )
+        requests = make_requests(
+            admin_token,
+            user_token,
+            args.admin_email,
+            args.admin_password,
+        )
+
+        report = {}
+        try:
+            for endpoint, request in requests.items():
+                if args.endpoint and endpoint not in args.endpoint:
+                    continue
+                await run_endpoint(client, request, args.warm_up, args.concurrency)
+                report[endpoint] = await run_endpoint(
+                    client,
+                    request,
+                    args.requests,
+                    args.concurrency,
+                )
+        finally:
+            await drop_created_users()
+
+    baseline = None
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=4) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", help="Server url, in-process app if empty")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warm-up", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoint", action="append", help="Endpoint to run")
+    parser.add_argument("--admin-email", default="admin@example.com")
+    parser.add_argument("--admin-password", default="1234567890")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed share of p95 growth or throughput drop",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,88 @@
+"""
+Benchmark of users listing serialization.
+
+Compares response_model path, where ORM users are validated through
+from_attributes and dumped again, with rows dumped straight by orjson.
+Uses generated users, so no database is needed.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+root_path = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, (root_path / "src").as_posix())
+
+import orjson  # noqa:E402
+from pydantic import TypeAdapter  # noqa:E402
+
+from dao.models import Role, User  # noqa:E402
+from dto.users.schemas import UserOutSchema  # noqa:E402
+from dto.users.serializers import dump_user_rows  # noqa:E402
+
+users_adapter = TypeAdapter(list[UserOutSchema])
+
+
+def make_users(users_count: int) -> list[User]:
+    return [
+        User(
+            id=number,
+            username=f"user-{number}",
+            email=f"user-{number}@example.com",
+            roles=[Role.user, Role.teacher],
+            is_active=True,
+        )
+        for number in range(1, users_count + 1)
+    ]
+
+
+def make_rows(users: list[User]) -> list[tuple]:
+    return [
+        (user.username, user.email, user.roles, user.id, user.is_active)
+        for user in users
+    ]
+
+
+def dump_with_response_model(users: list[User]) -> bytes:
+    """What FastAPI does for response_model and ORJSONResponse"""
+
+    validated = users_adapter.validate_python(users, from_attributes=True)
+    content = users_adapter.dump_python(validated, mode="json")
+    return orjson.dumps(content)
+
+
+def best_time(func: Callable[[], bytes], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    users = make_users(args.users)
+    rows = make_rows(users)
+    assert orjson.loads(dump_with_response_model(users)) == orjson.loads(
+        dump_user_rows(rows)
+    )
+
+    response_model_time = best_time(
+        lambda: dump_with_response_model(users), args.repeat
+    )
+    fast_path_time = best_time(lambda: dump_user_rows(rows), args.repeat)
+    print(f"{'path':<20}{'ms per ' + str(args.users) + ' users':>24}")
+    print(f"{'response_model':<20}{response_model_time * 1000:>24.2f}")
+    print(f"{'rows to orjson':<20}{fast_path_time * 1000:>24.2f}")
+    print(f"speedup x{response_model_time / fast_path_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
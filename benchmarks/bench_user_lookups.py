@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of user lookups on auth path.
+
+Compares statement built on every call, as lookups did before,
+with statements built once in dao.users. Reports per-call time
+of statement preparation only (build, cache key, compiled cache)
+and of full lookup against database.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+root_path = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, (root_path / "src").as_posix())
+
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa:E402
+
+from dao.models import User  # noqa:E402
+from dao.users import (  # noqa:E402
+    USER_BY_EMAIL,
+    UserLoadProfile,
+    fetch_user_by_email,
+    select_users,
+)
+from database.database import async_session, engine  # noqa:E402
+
+
+async def fetch_user_by_email_rebuilt(
+    session: AsyncSession,
+    email: str,
+    profile: UserLoadProfile = UserLoadProfile.public,
+):
+    """Lookup as it was before, statement is built on every call"""
+
+    stmt = select_users(profile).where(User.email == email)
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+def prepare_rebuilt(email: str, profile: UserLoadProfile) -> None:
+    stmt = select_users(profile).where(User.email == email)
+    stmt._generate_cache_key()
+
+
+def prepare_prebuilt(email: str, profile: UserLoadProfile) -> None:
+    USER_BY_EMAIL[profile]._generate_cache_key()
+
+
+def time_prepare(func: Callable, iterations: int, profile: UserLoadProfile) -> float:
+    started_at = time.perf_counter()
+    for number in range(iterations):
+        func(f"user{number}@example.com", profile)
+    return (time.perf_counter() - started_at) / iterations
+
+
+async def time_lookup(
+    func: Callable[..., Awaitable],
+    iterations: int,
+    email: str,
+    profile: UserLoadProfile,
+) -> float:
+    async with async_session() as session:
+        await func(session, email, profile)
+        started_at = time.perf_counter()
+        for _ in range(iterations):
+            await func(session, email, profile)
+        return (time.perf_counter() - started_at) / iterations
+
+
+def print_row(case: str, rebuilt: float, prebuilt: float) -> None:
+    print(f"{case:<28}{rebuilt * 1e6:>14.1f}{prebuilt * 1e6:>14.1f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--email", default="user@example.com")
+    parser.add_argument(
+        "--profile",
+        choices=[profile.value for profile in UserLoadProfile],
+        default=UserLoadProfile.auth.value,
+    )
+    parser.add_argument(
+        "--no-db",
+        action="store_true",
+        help="Measure statement preparation only",
+    )
+    args = parser.parse_args()
+    profile = UserLoadProfile(args.profile)
+
+    print(f"{'case':<28}{'rebuilt, us':>14}{'prebuilt, us':>14}")
+    rebuilt = time_prepare(prepare_rebuilt, args.iterations, profile)
+    prebuilt = time_prepare(prepare_prebuilt, args.iterations, profile)
+    print_row("statement preparation", rebuilt, prebuilt)
+
+    if not args.no_db:
+        rebuilt = await time_lookup(
+            fetch_user_by_email_rebuilt, args.iterations, args.email, profile
+        )
+        prebuilt = await time_lookup(
+            fetch_user_by_email, args.iterations, args.email, profile
+        )
+        print_row("lookup with database", rebuilt, prebuilt)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
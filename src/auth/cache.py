@@ -0,0 +1,129 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from config.config import TokenCacheConfig, settings
+from dto.tokens.schemas import TokenCacheStatsSchema
+from dto.users.schemas import UserPrincipalSchema
+
+# Rough size of claims dict and principal kept for every token
+ENTRY_OVERHEAD_BYTES = 1024
+
+
+class CachedToken(NamedTuple):
+    claims: dict
+    principal: UserPrincipalSchema
+    # Principal was loaded from database, not built from claims
+    verified: bool
+    expires_at: float
+    size: int
+
+
+class TokenCache:
+    """
+    LRU cache of verified tokens with TTL.
+    Bounded by entries count and approximate memory size.
+    """
+
+    def __init__(self, config: TokenCacheConfig) -> None:
+        self.config = config
+        self._entries: OrderedDict[str, CachedToken] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        """Get cached token or None if it is missing or expired"""
+
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry
+
+    def set(
+        self,
+        token: str,
+        claims: dict,
+        principal: UserPrincipalSchema,
+        verified: bool = False,
+    ) -> None:
+        """Cache token until TTL or token expiration, whichever is earlier"""
+
+        if not self.config.enabled:
+            return
+        ttl = float(self.config.ttl_seconds)
+        if "exp" in claims:
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl <= 0:
+            return
+
+        if token in self._entries:
+            self._remove(token)
+        entry = CachedToken(
+            claims=claims,
+            principal=principal,
+            verified=verified,
+            expires_at=time.monotonic() + ttl,
+            size=sys.getsizeof(token) + ENTRY_OVERHEAD_BYTES,
+        )
+        self._entries[token] = entry
+        self._tokens_by_user.setdefault(principal.id, set()).add(token)
+        self.bytes += entry.size
+
+        while (
+            len(self._entries) > self.config.max_entries
+            or self.bytes > self.config.max_bytes
+        ):
+            oldest_token = next(iter(self._entries))
+            self._remove(oldest_token)
+            self.evictions += 1
+
+    def invalidate(self, token: str) -> None:
+        """Drop given token from cache"""
+
+        if token in self._entries:
+            self._remove(token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop all cached tokens of given user"""
+
+        for token in self._tokens_by_user.pop(user_id, set()):
+            entry = self._entries.pop(token, None)
+            if entry is not None:
+                self.bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tokens_by_user.clear()
+        self.bytes = 0
+
+    def stats(self) -> TokenCacheStatsSchema:
+        return TokenCacheStatsSchema(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            entries=len(self._entries),
+            bytes=self.bytes,
+        )
+
+    def _remove(self, token: str) -> None:
+        entry = self._entries.pop(token)
+        self.bytes -= entry.size
+        user_tokens = self._tokens_by_user.get(entry.principal.id)
+        if user_tokens is not None:
+            user_tokens.discard(token)
+            if not user_tokens:
+                del self._tokens_by_user[entry.principal.id]
+
+
+token_cache = TokenCache(settings.token_cache)
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select
+
+from config.config import EmailLookupConfig, settings
+from core.bloom import BloomFilter
+from dao.models import User
+from database.database import async_session
+from loggers.loggers import logger
+
+
+class MissingEmailCache:
+    """LRU cache with TTL of emails which were not found in database"""
+
+    def __init__(self, config: EmailLookupConfig) -> None:
+        self.config = config
+        self._expires_at: OrderedDict[str, float] = OrderedDict()
+        self.hits = 0
+
+    def __contains__(self, email: str) -> bool:
+        expires_at = self._expires_at.get(email)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._expires_at[email]
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, email: str) -> None:
+        if not self.config.enabled:
+            return
+        self._expires_at.pop(email, None)
+        self._expires_at[email] = time.monotonic() + self.config.ttl_seconds
+        while len(self._expires_at) > self.config.max_entries:
+            self._expires_at.popitem(last=False)
+
+    def discard(self, email: str) -> None:
+        self._expires_at.pop(email, None)
+
+    def clear(self) -> None:
+        self._expires_at.clear()
+
+
+class KnownEmails:
+    """
+    Bloom filter of all emails in database.
+    Emails of users created or changed by other workers are picked up
+    by periodic sync by updated_at, and dropped from missing emails cache.
+    Emails of deleted users are dropped by periodic rebuild.
+    """
+
+    def __init__(
+        self,
+        config: EmailLookupConfig,
+        missing_emails: MissingEmailCache,
+    ) -> None:
+        self.config = config
+        self.missing_emails = missing_emails
+        self.bloom: Optional[BloomFilter] = None
+        self.synced_at = datetime.fromtimestamp(0, timezone.utc)
+        self.hits = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, email: str) -> bool:
+        """Email may exist, always true until filter is built"""
+
+        if self.bloom is None or email in self.bloom:
+            return True
+        self.hits += 1
+        return False
+
+    def add(self, email: str) -> None:
+        if self.bloom is not None:
+            self.bloom.add(email)
+
+    async def _load(self, bloom: Optional[BloomFilter], since: datetime) -> datetime:
+        """Add emails of users changed since given time, return load start"""
+
+        loaded_at = datetime.now(timezone.utc)
+        async with async_session() as session:
+            result = await session.stream_scalars(
+                select(User.email)
+                .where(User.updated_at >= since)
+                .execution_options(yield_per=10_000)
+            )
+            async for email in result:
+                if bloom is not None:
+                    bloom.add(email)
+                self.missing_emails.discard(email)
+        return loaded_at
+
+    async def sync(self) -> None:
+        """Add emails of users created or changed since last sync"""
+
+        # updated_at is set before commit, so rows committed after previous
+        # sync started may be older than it
+        since = self.synced_at - timedelta(seconds=self.config.sync_overlap_seconds)
+        self.synced_at = await self._load(self.bloom, since)
+
+    async def rebuild(self) -> None:
+        """Build new filter from all emails and swap it in"""
+
+        bloom = BloomFilter(
+            self.config.bloom_capacity,
+            self.config.bloom_error_rate,
+        )
+        synced_at = await self._load(bloom, datetime.fromtimestamp(0, timezone.utc))
+        self.bloom, self.synced_at = bloom, synced_at
+        logger.info("Known emails bloom filter built, %s emails.", bloom.count)
+
+    async def _refresh_forever(self) -> None:
+        rebuilt_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.config.sync_interval_seconds)
+            try:
+                if (
+                    self.config.bloom_enabled
+                    and time.monotonic() - rebuilt_at
+                    > self.config.bloom_rebuild_interval_seconds
+                ):
+                    await self.rebuild()
+                    rebuilt_at = time.monotonic()
+                else:
+                    await self.sync()
+            except Exception:
+                logger.exception("Known emails refresh error.")
+
+    async def start(self) -> None:
+        """Build filter if enabled and sync changes of other workers"""
+
+        if not self.config.enabled:
+            return
+        if self.config.bloom_enabled:
+            await self.rebuild()
+        else:
+            self.synced_at = datetime.now(timezone.utc)
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+missing_emails = MissingEmailCache(settings.email_lookup)
+known_emails = KnownEmails(settings.email_lookup, missing_emails)
+
+
+def email_may_exist(email: str) -> bool:
+    """False if user with email surely does not exist, without database"""
+
+    return email not in missing_emails and email in known_emails
+
+
+def remember_email(email: str) -> None:
+    """Email of created or changed user, call after commit"""
+
+    missing_emails.discard(email)
+    known_emails.add(email)
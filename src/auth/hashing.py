@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, Optional
+
+from passlib.hash import argon2, bcrypt
+
+from auth.schemas import configure_pwd_context, pwd_context
+from config.config import HashingConfig, settings
+from loggers.loggers import logger
+
+CALIBRATION_PASSWORD = "calibration-password"
+
+
+class HashingPoolSaturatedError(Exception):
+    """Raised when hashing pool has no free slots for a new job"""
+
+
+def hash_password(password: str) -> str:
+    """Hash password, runs inside hashing worker"""
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password, runs inside hashing worker"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def make_pwd_policy(
+    config: HashingConfig,
+    bcrypt_rounds: Optional[int] = None,
+    argon2_time_cost: Optional[int] = None,
+) -> dict:
+    """
+    Make CryptContext settings for configured scheme.
+    Hashes of other schemes or with lower cost are marked as needing update.
+    """
+
+    bcrypt_rounds = bcrypt_rounds or config.bcrypt_rounds
+    policy = {
+        "schemes": [config.scheme] + (["bcrypt"] if config.scheme != "bcrypt" else []),
+        "default": config.scheme,
+        "deprecated": "auto",
+        "bcrypt__rounds": bcrypt_rounds,
+        "bcrypt__min_rounds": bcrypt_rounds,
+    }
+    if config.scheme == "argon2":
+        policy.update(
+            argon2__time_cost=argon2_time_cost or config.argon2_time_cost,
+            argon2__memory_cost=config.argon2_memory_cost,
+            argon2__parallelism=config.argon2_parallelism,
+        )
+    return policy
+
+
+def measure_hash_ms(handler: Any) -> float:
+    started_at = time.perf_counter()
+    handler.hash(CALIBRATION_PASSWORD)
+    return (time.perf_counter() - started_at) * 1000
+
+
+def calibrate_pwd_policy(config: HashingConfig) -> dict:
+    """Find the highest hashing cost which still fits into target_ms"""
+
+    if config.target_ms is None:
+        return make_pwd_policy(config)
+
+    if config.scheme == "argon2":
+        time_cost = 1
+        for candidate in range(1, config.argon2_max_time_cost + 1):
+            handler = argon2.using(
+                time_cost=candidate,
+                memory_cost=config.argon2_memory_cost,
+                parallelism=config.argon2_parallelism,
+            )
+            if measure_hash_ms(handler) > config.target_ms:
+                break
+            time_cost = candidate
+        logger.info("Calibrated argon2 time_cost: %s", time_cost)
+        return make_pwd_policy(config, argon2_time_cost=time_cost)
+
+    rounds = config.bcrypt_min_rounds
+    for candidate in range(config.bcrypt_min_rounds, config.bcrypt_max_rounds + 1):
+        if measure_hash_ms(bcrypt.using(rounds=candidate)) > config.target_ms:
+            break
+        rounds = candidate
+    logger.info("Calibrated bcrypt rounds: %s", rounds)
+    return make_pwd_policy(config, bcrypt_rounds=rounds)
+
+
+class HashingExecutor:
+    """
+    Bounded pool for CPU-bound password hashing.
+    Jobs above max_workers + max_queue_depth are rejected.
+    """
+
+    def __init__(self, config: HashingConfig) -> None:
+        self.config = config
+        self.max_workers = config.max_workers or os.cpu_count() or 1
+        self.max_pending = self.max_workers + config.max_queue_depth
+        # One worker is left to batch jobs if there are no others to reserve
+        self.max_batch_workers = max(1, self.max_workers - config.reserved_workers)
+        self._batch_slots = asyncio.Semaphore(self.max_batch_workers)
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+        self.configure(make_pwd_policy(config))
+
+    def configure(self, policy: dict) -> None:
+        """Apply hashing policy here and in pool processes started later"""
+
+        self.policy = policy
+        configure_pwd_context(policy)
+
+    def calibrate(self) -> None:
+        """Measure hashing cost on this hardware before pool is started"""
+
+        self.configure(calibrate_pwd_policy(self.config))
+
+    def start(self) -> Executor:
+        """Create worker pool if it is not created yet"""
+
+        if self._executor is None:
+            if self.config.executor == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=configure_pwd_context,
+                    initargs=(self.policy,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="hashing",
+                )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Stop worker pool"""
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func in worker pool or reject it when pool is saturated"""
+
+        if self.pending >= self.max_pending:
+            raise HashingPoolSaturatedError
+        return await self._submit(func, *args)
+
+    async def run_many(
+        self,
+        func: Callable[..., Any],
+        args_list: Iterable[tuple],
+    ) -> list[Any]:
+        """
+        Run func for every args in worker pool. All batches together keep
+        at most max_batch_workers jobs at once and wait for free slots
+        instead of rejecting, so reserved workers stay free for single jobs.
+        """
+
+        async def run_one(args: tuple) -> Any:
+            async with self._batch_slots:
+                return await self._submit(func, *args)
+
+        return await asyncio.gather(*(run_one(args) for args in args_list))
+
+    async def _submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        executor = self.start()
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(executor, partial(func, *args))
+        finally:
+            self.pending -= 1
+
+
+hashing_executor = HashingExecutor(settings.hashing)
@@ -0,0 +1,103 @@
+import hashlib
+from typing import Any, Optional
+
+import jwt
+import orjson
+from jwt.exceptions import InvalidKeyError, InvalidTokenError
+
+from config.config import AuthData, settings
+
+PRIVATE_KEY_SUFFIX = ".pem"
+PUBLIC_KEY_SUFFIX = ".pub.pem"
+
+
+class KeyRing:
+    """
+    Parsed signing and verification keys of tokens.
+    Keys are parsed once at startup and kept as key objects,
+    so encoding and decoding do not parse PEM every time.
+    """
+
+    def __init__(self, config: AuthData) -> None:
+        self.algorithm = config.algorithm
+        self.jwks_max_age_seconds = config.jwks_max_age_seconds
+        self._algorithm = jwt.get_algorithm_by_name(config.algorithm)
+        self.signing_keys: dict[Optional[str], Any] = {}
+        self.verification_keys: dict[Optional[str], Any] = {}
+
+        if self.is_symmetric:
+            key = self._algorithm.prepare_key(config.secret_key)
+            self.signing_keys[None] = key
+            self.verification_keys[None] = key
+            self.signing_kid = None
+        else:
+            self._load_keys(config)
+            self.signing_kid = config.signing_kid or max(self.signing_keys)
+            if self.signing_kid not in self.signing_keys:
+                raise InvalidKeyError(f"No private key for kid {self.signing_kid}")
+
+        self.jwks = self._make_jwks()
+        self.jwks_etag = '"{}"'.format(hashlib.sha256(self.jwks).hexdigest()[:32])
+
+    @property
+    def is_symmetric(self) -> bool:
+        return self.algorithm.startswith("HS")
+
+    def _load_keys(self, config: AuthData) -> None:
+        if config.keys_dir is None:
+            raise InvalidKeyError(f"AUTH__KEYS_DIR is required for {self.algorithm}")
+
+        for path in sorted(config.keys_dir.glob(f"*{PRIVATE_KEY_SUFFIX}")):
+            key = self._algorithm.prepare_key(path.read_bytes())
+            if path.name.endswith(PUBLIC_KEY_SUFFIX):
+                kid = path.name.removesuffix(PUBLIC_KEY_SUFFIX)
+                self.verification_keys[kid] = key
+            else:
+                kid = path.name.removesuffix(PRIVATE_KEY_SUFFIX)
+                self.signing_keys[kid] = key
+                self.verification_keys[kid] = key.public_key()
+
+        if not self.signing_keys:
+            raise InvalidKeyError(f"No private keys in {config.keys_dir}")
+
+    def _make_jwks(self) -> bytes:
+        """Make JSON Web Key Set of public keys"""
+
+        keys = []
+        if not self.is_symmetric:
+            for kid, key in self.verification_keys.items():
+                jwk = self._algorithm.to_jwk(key, as_dict=True)
+                jwk.update(kid=kid, use="sig", alg=self.algorithm)
+                keys.append(jwk)
+        return orjson.dumps({"keys": keys})
+
+    def signing_key(self) -> tuple[Optional[str], Any]:
+        return self.signing_kid, self.signing_keys[self.signing_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Any:
+        if self.is_symmetric:
+            return self.verification_keys[None]
+        try:
+            return self.verification_keys[kid]
+        except KeyError:
+            raise InvalidTokenError(f"Unknown key id {kid}")
+
+    def encode(self, payload: dict) -> str:
+        kid, key = self.signing_key()
+        return jwt.encode(
+            payload=payload,
+            key=key,
+            algorithm=self.algorithm,
+            headers={"kid": kid} if kid else None,
+        )
+
+    def decode(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        return jwt.decode(
+            jwt=token,
+            key=self.verification_key(kid),
+            algorithms=[self.algorithm],
+        )
+
+
+key_ring = KeyRing(settings.auth)
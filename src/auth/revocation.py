@@ -0,0 +1,178 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.config import RevocationConfig, settings
+from core.bloom import BloomFilter
+from dao.models import RefreshToken, RevokedToken
+from database.database import async_session, primary_session
+from loggers.loggers import logger
+
+
+def token_key(jti: str) -> str:
+    return f"jti:{jti}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class RevocationList:
+    """
+    Revoked tokens in database fronted by bloom filter of their keys.
+    Most tokens are not revoked and are checked with bloom probes only,
+    database is queried when bloom filter says key may be revoked.
+    """
+
+    def __init__(self, config: RevocationConfig) -> None:
+        self.config = config
+        self.bloom = BloomFilter(config.bloom_capacity, config.bloom_error_rate)
+        self.synced_at = datetime.fromtimestamp(0, timezone.utc)
+        self.bloom_hits = 0
+        # Keys revoked here while rebuild loads new filter, None otherwise
+        self._added_while_loading: Optional[list[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def is_revoked(self, session: AsyncSession, claims: dict) -> bool:
+        keys = [user_key(claims["uid"])] if "uid" in claims else []
+        if "jti" in claims:
+            keys.append(token_key(claims["jti"]))
+        maybe_revoked = [key for key in keys if key in self.bloom]
+        if not maybe_revoked:
+            return False
+
+        self.bloom_hits += 1
+        # Replica may not have revocation committed on primary yet
+        async with primary_session(session) as primary:
+            result = await primary.execute(
+                select(RevokedToken.key, RevokedToken.revoked_at).where(
+                    RevokedToken.key.in_(maybe_revoked),
+                    RevokedToken.expires_at > datetime.now(timezone.utc),
+                )
+            )
+        if "iat_ms" in claims:
+            issued_at = claims["iat_ms"] / 1000
+        else:
+            issued_at = claims.get("iat", 0)
+        for key, revoked_at in result.all():
+            if key.startswith("jti:") or issued_at <= revoked_at.timestamp():
+                return True
+        return False
+
+    async def _add(
+        self,
+        session: AsyncSession,
+        key: str,
+        expires_at: datetime,
+    ) -> None:
+        stmt = insert(RevokedToken).values(
+            key=key,
+            revoked_at=datetime.now(timezone.utc),
+            expires_at=expires_at,
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[RevokedToken.key],
+                set_={
+                    "revoked_at": stmt.excluded.revoked_at,
+                    "expires_at": stmt.excluded.expires_at,
+                },
+            )
+        )
+        self.bloom.add(key)
+        if self._added_while_loading is not None:
+            self._added_while_loading.append(key)
+
+    async def revoke_token(self, session: AsyncSession, claims: dict) -> None:
+        """Revoke one token until it expires, session is committed by caller"""
+
+        await self._add(
+            session,
+            token_key(claims["jti"]),
+            datetime.fromtimestamp(claims["exp"], timezone.utc),
+        )
+
+    async def revoke_user(self, session: AsyncSession, user_id: int) -> None:
+        """Revoke all tokens issued to user till now"""
+
+        await self._add(
+            session,
+            user_key(user_id),
+            datetime.now(timezone.utc)
+            + timedelta(minutes=settings.auth.access_token_expire_minutes),
+        )
+
+    async def _load(self, bloom: BloomFilter, since: datetime) -> datetime:
+        """Add keys revoked since given time to bloom, return load start"""
+
+        loaded_at = datetime.now(timezone.utc)
+        async with async_session() as session:
+            result = await session.execute(
+                select(RevokedToken.key).where(RevokedToken.revoked_at >= since)
+            )
+            for key in result.scalars():
+                bloom.add(key)
+        return loaded_at
+
+    async def sync(self) -> None:
+        """Add keys revoked by other workers since last sync to bloom filter"""
+
+        # revoked_at is set before commit, so rows committed after previous
+        # sync started may be older than it
+        since = self.synced_at - timedelta(seconds=self.config.sync_overlap_seconds)
+        self.synced_at = await self._load(self.bloom, since)
+
+    async def rebuild(self) -> None:
+        """Purge expired keys, build new bloom filter and swap it in"""
+
+        now = datetime.now(timezone.utc)
+        async with async_session() as session:
+            await session.execute(
+                delete(RevokedToken).where(RevokedToken.expires_at <= now)
+            )
+            # Revoked refresh tokens are kept till expiry to detect their reuse
+            await session.execute(
+                delete(RefreshToken).where(RefreshToken.expires_at <= now)
+            )
+            await session.commit()
+        bloom = BloomFilter(self.config.bloom_capacity, self.config.bloom_error_rate)
+        self._added_while_loading = []
+        try:
+            synced_at = await self._load(bloom, datetime.fromtimestamp(0, timezone.utc))
+            for key in self._added_while_loading:
+                bloom.add(key)
+        finally:
+            self._added_while_loading = None
+        self.bloom, self.synced_at = bloom, synced_at
+        logger.info("Revocation bloom filter rebuilt, %s keys.", bloom.count)
+
+    async def _refresh_forever(self) -> None:
+        rebuilt_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.config.sync_interval_seconds)
+            try:
+                if time.monotonic() - rebuilt_at > self.config.purge_interval_seconds:
+                    await self.rebuild()
+                    rebuilt_at = time.monotonic()
+                else:
+                    await self.sync()
+            except Exception:
+                logger.exception("Revocation list refresh error.")
+
+    async def start(self) -> None:
+        await self.rebuild()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+revocation_list = RevocationList(settings.revocation)
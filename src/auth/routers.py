@@ -1,45 +1,176 @@
+import time
 from datetime import timedelta
 from pathlib import Path
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from fastapi.security import OAuth2PasswordRequestForm
 
-from auth.utils import authenticate_user, create_access_token
+from auth.cache import token_cache
+from auth.keys import key_ring
+from auth.revocation import revocation_list
+from auth.schemas import OAuth2TokenRequestForm, oauth2_scheme
+from auth.utils import (
+    authenticate_user,
+    create_access_token,
+    create_refresh_token,
+    get_current_active_admin,
+    get_current_active_user,
+    get_current_token_claims,
+    introspect_tokens,
+    make_token_claims,
+    rotate_refresh_token,
+)
 from config.config import settings
-from database.database import CommonAsyncScopedSession
-from dto.tokens.schemas import Token
+from database.database import CommonAsyncSession
+from dto.tokens.schemas import (
+    Token,
+    TokenCacheStatsSchema,
+    TokenIntrospectRequestSchema,
+    TokenIntrospectResponseSchema,
+)
+from dto.users.schemas import UserPrincipalSchema
+from limiter.utils import limit_login_attempts
 
 router = APIRouter(tags=["Auth"])
 
 
-@router.post("/token", response_model=Token)
+@router.post(
+    "/token",
+    dependencies=[Depends(limit_login_attempts)],
+    response_model=Token,
+    responses={429: {"description": "Too many login attempts"}},
+)
 async def create_token(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: CommonAsyncScopedSession,
+    form_data: Annotated[OAuth2TokenRequestForm, Depends()],
+    session: CommonAsyncSession,
 ):
     """
-    Get credentials from form-data and create access_token.
+    Get credentials or refresh_token from form-data and create access_token
+    with new refresh_token.
     In this case uses "Content-type": "application/x-www-form-urlencoded"
     """
     incorrect_credentials_exception = HTTPException(
         status_code=status.HTTP_400_BAD_REQUEST,
         detail="Incorrect username or password",
     )
+    invalid_refresh_token_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid refresh token",
+    )
 
-    email = form_data.username
-    password = form_data.password
+    if form_data.grant_type == "refresh_token":
+        if not form_data.refresh_token:
+            raise invalid_refresh_token_exception
+        rotated = await rotate_refresh_token(session, form_data.refresh_token)
+        if rotated is None:
+            raise invalid_refresh_token_exception
+        user, refresh_token = rotated
 
-    user = await authenticate_user(session, email, password)
-    if not user:
-        raise incorrect_credentials_exception
+    else:
+        user = await authenticate_user(session, form_data.username, form_data.password)
+        if not user:
+            raise incorrect_credentials_exception
+        user = UserPrincipalSchema.model_validate(user)
+        refresh_token = await create_refresh_token(session, user.id)
+        await session.commit()
 
     access_token_expires = timedelta(
         minutes=settings.auth.access_token_expire_minutes,
     )
     access_token = await create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=make_token_claims(user), expires_delta=access_token_expires
+    )
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+    )
+
+
+@router.post(
+    "/logout",
+    dependencies=[Depends(get_current_active_user)],
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    claims: Annotated[dict, Depends(get_current_token_claims)],
+    session: CommonAsyncSession,
+):
+    """Revoke current access token"""
+
+    if "jti" not in claims:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token can not be revoked",
+        )
+    await revocation_list.revoke_token(session, claims)
+    await session.commit()
+    token_cache.invalidate(token)
+
+
+@router.post(
+    "/token/introspect",
+    dependencies=[Depends(get_current_active_admin)],
+    response_model=TokenIntrospectResponseSchema,
+    response_model_exclude_none=True,
+)
+async def introspect(
+    body: TokenIntrospectRequestSchema,
+    session: CommonAsyncSession,
+    response: Response,
+):
+    """
+    Check batch of tokens for gateways (RFC 7662 style).
+    Result may be cached until the first of active tokens expires.
+    """
+
+    results = await introspect_tokens(session, body.tokens)
+
+    max_age = settings.auth.introspection_max_age_seconds
+    now = int(time.time())
+    for result in results:
+        if result.active and result.exp is not None:
+            max_age = min(max_age, max(0, result.exp - now))
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return TokenIntrospectResponseSchema(results=results)
+
+
+@router.get(
+    "/token/cache-stats",
+    dependencies=[Depends(get_current_active_admin)],
+    response_model=TokenCacheStatsSchema,
+)
+async def get_token_cache_stats():
+    """Get hit/miss/eviction counters of verified-token cache"""
+
+    return token_cache.stats()
+
+
+@router.get(
+    "/.well-known/jwks.json",
+    response_class=Response,
+    responses={
+        200: {
+            "description": "JSON Web Key Set of token signing keys",
+            "content": {"application/json": {}},
+        },
+        304: {"description": "Not modified"},
+    },
+)
+async def get_jwks(request: Request):
+    """Get public keys, so other services can validate tokens themselves"""
+
+    headers = {
+        "Cache-Control": "public, max-age={}".format(key_ring.jwks_max_age_seconds),
+        "ETag": key_ring.jwks_etag,
+    }
+    if request.headers.get("if-none-match") == key_ring.jwks_etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=key_ring.jwks,
+        media_type="application/json",
+        headers=headers,
     )
-    return Token(access_token=access_token, token_type="bearer")
@@ -1,6 +1,42 @@
+from typing import Annotated, Optional
+
+from fastapi import Form
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def configure_pwd_context(policy: dict) -> None:
+    """Apply hashing policy, also used as hashing process initializer"""
+    pwd_context.update(**policy)
+
+
+class OAuth2TokenRequestForm:
+    """
+    Token request form for password and refresh_token grants.
+    Same as OAuth2PasswordRequestForm, but username and password
+    are not required for refresh_token grant.
+    """
+
+    def __init__(
+        self,
+        grant_type: Annotated[
+            str, Form(pattern="^(password|refresh_token)$")
+        ] = "password",
+        username: Annotated[str, Form()] = "",
+        password: Annotated[str, Form()] = "",
+        refresh_token: Annotated[Optional[str], Form()] = None,
+        scope: Annotated[str, Form()] = "",
+        client_id: Annotated[Optional[str], Form()] = None,
+        client_secret: Annotated[Optional[str], Form()] = None,
+    ):
+        self.grant_type = grant_type
+        self.username = username
+        self.password = password
+        self.refresh_token = refresh_token
+        self.scopes = scope.split()
+        self.client_id = client_id
+        self.client_secret = client_secret
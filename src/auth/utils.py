@@ -1,30 +1,83 @@
+import asyncio
+import hashlib
+import secrets
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Annotated, Optional
 
-import jwt
 from fastapi import Depends, HTTPException, status
 from jwt.exceptions import InvalidTokenError
 from passlib.exc import UnknownHashError
+from pydantic import ValidationError
+from sqlalchemy import exists, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from auth.cache import token_cache
+from auth.emails import email_may_exist, missing_emails
+from auth.hashing import (
+    HashingPoolSaturatedError,
+    check_password,
+    hash_password,
+    hashing_executor,
+)
+from auth.keys import key_ring
+from auth.revocation import revocation_list
 from auth.schemas import oauth2_scheme, pwd_context
 from config.config import settings
-from dao.models import Role, User
-from database.database import CommonAsyncScopedSession
-from dto.tokens.schemas import TokenData
-from dto.users.utils import fetch_user_by_email, fetch_user_by_username
+from dao.models import Password, RefreshToken, User
+from dao.users import (
+    UserLoadProfile,
+    fetch_user_by_email,
+    fetch_user_by_username,
+    fetch_users_by_emails,
+)
+from database.database import CommonAsyncSession, async_session, primary_session
+from dto.tokens.schemas import TokenClaimsSchema, TokenData, TokenIntrospectionSchema
+from dto.users.schemas import RoleSchema, UserPrincipalSchema
+from dto.users.utils import load_principal_by_email
+from loggers.loggers import logger
+from monitoring.metrics import password_hashing_duration, token_encode_duration
+
+# Keeps references to running fire-and-forget tasks
+background_tasks: set[asyncio.Task] = set()
+
+
+hashing_unavailable_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Server is busy, try again later",
+    headers={"Retry-After": str(settings.hashing.retry_after_seconds)},
+)
 
 
 async def get_password_hash(password: str):
     """Make hashed password from given password"""
-    hashed_password = pwd_context.hash(password)
+    try:
+        with password_hashing_duration.time("hash"):
+            hashed_password = await hashing_executor.run(hash_password, password)
+    except HashingPoolSaturatedError:
+        raise hashing_unavailable_exception
     return hashed_password
 
 
+async def get_password_hashes(passwords: list[str]) -> list[str]:
+    """Make hashed passwords from given passwords in parallel"""
+    return await hashing_executor.run_many(
+        hash_password,
+        [(password,) for password in passwords],
+    )
+
+
 async def verify_password(plain_password: str, hashed_password: str):
     """Check equality given password with hashed password"""
     try:
-        is_correct = pwd_context.verify(plain_password, hashed_password)
+        with password_hashing_duration.time("verify"):
+            is_correct = await hashing_executor.run(
+                check_password,
+                plain_password,
+                hashed_password,
+            )
+    except HashingPoolSaturatedError:
+        raise hashing_unavailable_exception
     except UnknownHashError as exc:
         raise HTTPException(
             status_code=400,
@@ -33,19 +86,67 @@ async def verify_password(plain_password: str, hashed_password: str):
     return is_correct
 
 
+# Hash of random password, checked when user is missing to spend the same time
+_dummy_password_hash: Optional[str] = None
+
+
+async def verify_dummy_password(password: str) -> None:
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = await get_password_hash(secrets.token_urlsafe(16))
+    await verify_password(password, _dummy_password_hash)
+
+
 async def authenticate_user(
     session: AsyncSession,
     email: str,
     password: str,
 ):
-    user = await get_user_from_db(session, email=email)
+    if not email_may_exist(email):
+        await verify_dummy_password(password)
+        return False
+    user = await get_user_from_db(
+        session,
+        email=email,
+        profile=UserLoadProfile.auth,
+    )
     if not user:
+        missing_emails.add(email)
+        await verify_dummy_password(password)
         return False
     if not await verify_password(password, user.password.hashed_password):
         return False
+    if pwd_context.needs_update(user.password.hashed_password):
+        schedule_password_rehash(user.password.id, password)
     return user
 
 
+async def rehash_password(password_id: int, password: str) -> None:
+    """Hash password with current policy and save it"""
+
+    try:
+        hashed_password = await hashing_executor.run(hash_password, password)
+    except HashingPoolSaturatedError:
+        logger.info("Hashing pool is busy, rehash of %s postponed.", password_id)
+        return
+
+    async with async_session() as session:
+        await session.execute(
+            update(Password)
+            .where(Password.id == password_id)
+            .values(hashed_password=hashed_password)
+        )
+        await session.commit()
+
+
+def schedule_password_rehash(password_id: int, password: str) -> None:
+    """Rehash password in background, so login does not wait for it"""
+
+    task = asyncio.create_task(rehash_password(password_id, password))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
 async def create_access_token(
     data: dict,
     expires_delta: timedelta | None = None,
@@ -57,58 +158,325 @@ async def create_access_token(
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
-        payload=to_encode,
-        key=settings.auth.secret_key,
-        algorithm=settings.auth.algorithm,
+    issued_at = datetime.now(timezone.utc)
+    to_encode.update(
+        {
+            "exp": expire,
+            "iat": issued_at,
+            # iat has whole seconds, revocation of user needs finer time
+            "iat_ms": int(issued_at.timestamp() * 1000),
+            "jti": uuid.uuid4().hex,
+        }
     )
+    with token_encode_duration.time():
+        encoded_jwt = key_ring.encode(to_encode)
     return encoded_jwt
 
 
+def make_token_claims(user: UserPrincipalSchema) -> dict:
+    """Claims enough to authorize user without database"""
+
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "name": user.username,
+        "roles": [role.value for role in user.roles],
+        "active": user.is_active,
+        "ver": user.token_version,
+    }
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    """Refresh tokens are random, so fast hash is enough to store them"""
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+async def create_refresh_token(
+    session: AsyncSession,
+    user_id: int,
+    family_id: Optional[str] = None,
+) -> str:
+    """
+    Add refresh token of user to session.
+    Tokens rotated from one login share family_id.
+    """
+
+    refresh_token = secrets.token_urlsafe(32)
+    session.add(
+        RefreshToken(
+            token_hash=hash_refresh_token(refresh_token),
+            family_id=family_id or uuid.uuid4().hex,
+            user_id=user_id,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.auth.refresh_token_expire_days),
+        )
+    )
+    return refresh_token
+
+
+async def rotate_refresh_token(
+    session: AsyncSession,
+    refresh_token: str,
+) -> Optional[tuple[UserPrincipalSchema, str]]:
+    """
+    Revoke given refresh token and issue next one of the same family.
+    Returns current state of token owner and new refresh token.
+    Reuse of revoked token revokes the whole family.
+    """
+
+    token_hash = hash_refresh_token(refresh_token)
+    # Core tables, ORM update can not return columns of joined users
+    refresh_tokens, users = RefreshToken.__table__, User.__table__
+    stmt = (
+        update(refresh_tokens)
+        .where(
+            refresh_tokens.c.token_hash == token_hash,
+            refresh_tokens.c.revoked.is_(False),
+            refresh_tokens.c.user_id == users.c.id,
+        )
+        .values(revoked=True)
+        .returning(
+            refresh_tokens.c.family_id,
+            refresh_tokens.c.expires_at,
+            users.c.id,
+            users.c.username,
+            users.c.email,
+            users.c.roles,
+            users.c.is_active,
+            users.c.token_version,
+        )
+    )
+    result = await session.execute(stmt)
+    row = result.one_or_none()
+
+    if row is None:
+        is_reused = await session.scalar(
+            select(exists().where(RefreshToken.token_hash == token_hash))
+        )
+        if is_reused:
+            logger.warning("Refresh token reuse detected, family revoked.")
+            await session.execute(
+                update(RefreshToken)
+                .where(
+                    RefreshToken.family_id
+                    == select(RefreshToken.family_id)
+                    .where(RefreshToken.token_hash == token_hash)
+                    .scalar_subquery()
+                )
+                .values(revoked=True)
+            )
+            await session.commit()
+        return None
+
+    if row.expires_at <= datetime.now(timezone.utc) or not row.is_active:
+        await session.commit()
+        return None
+
+    new_refresh_token = await create_refresh_token(session, row.id, row.family_id)
+    await session.commit()
+    return UserPrincipalSchema.model_validate(row), new_refresh_token
+
+
+async def revoke_user_tokens(session: AsyncSession, user_id: int) -> None:
+    """
+    Revoke access and refresh tokens issued to user till now.
+    Session is committed by caller.
+    """
+
+    await revocation_list.revoke_user(session, user_id)
+    await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False))
+        .values(revoked=True)
+    )
+
+
 async def get_user_from_db(
     session: AsyncSession,
     username: Optional[str] = None,
     email: Optional[str] = None,
+    profile: UserLoadProfile = UserLoadProfile.public,
 ) -> Optional[User]:
     if username:
-        return await fetch_user_by_username(session, username)
+        return await fetch_user_by_username(session, username, profile)
     if email:
-        return await fetch_user_by_email(session, email)
+        return await fetch_user_by_email(session, email, profile)
 
 
-async def get_current_user(
-    session: CommonAsyncScopedSession,
-    token: Annotated[str, Depends(oauth2_scheme)],
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def get_principal_from_claims(payload: dict) -> Optional[UserPrincipalSchema]:
+    """Get user from claims of token younger than claims_max_age_seconds"""
+
     try:
-        payload = jwt.decode(
-            jwt=token,
-            key=settings.auth.secret_key,
-            algorithms=[settings.auth.algorithm],
-        )
-        user_email: str = payload.get("sub")
-        if user_email is None:
+        claims = TokenClaimsSchema.model_validate(payload)
+    except ValidationError:
+        return None
+    token_age = datetime.now(timezone.utc).timestamp() - claims.iat
+    if token_age > settings.auth.claims_max_age_seconds:
+        return None
+    return UserPrincipalSchema(
+        id=claims.uid,
+        username=claims.name,
+        email=claims.sub,
+        roles=claims.roles,
+        is_active=claims.active,
+        token_version=claims.ver,
+    )
+
+
+async def resolve_principal(
+    session: AsyncSession,
+    token: str,
+    trust_claims: bool,
+) -> UserPrincipalSchema:
+    """
+    Get user of token from cache, from token claims if trust_claims
+    or from database checking that token version is still current.
+    """
+
+    cached_token = token_cache.get(token)
+    # Principal built from claims is served only if claims are trusted
+    if cached_token is not None and (trust_claims or cached_token.verified):
+        if await revocation_list.is_revoked(session, cached_token.claims):
+            token_cache.invalidate(token)
             raise credentials_exception
-        token_data = TokenData(user_email=user_email)
-    except InvalidTokenError:
+        return cached_token.principal
+
+    if cached_token is not None:
+        payload = cached_token.claims
+    else:
+        try:
+            payload = key_ring.decode(token)
+        except InvalidTokenError:
+            raise credentials_exception
+    user_email: str = payload.get("sub")
+    if user_email is None:
         raise credentials_exception
+    token_data = TokenData(user_email=user_email)
 
-    current_user = await get_user_from_db(session, email=token_data.user_email)
-    if current_user is None:
+    if await revocation_list.is_revoked(session, payload):
         raise credentials_exception
 
-    return current_user
+    principal = get_principal_from_claims(payload) if trust_claims else None
+    verified = principal is None
+    if principal is None:
+        # Token version is checked against primary, not lagging replica
+        async with primary_session(session) as session:
+            principal = await load_principal_by_email(session, token_data.user_email)
+        if principal is None:
+            raise credentials_exception
+        if payload.get("ver", 0) != principal.token_version:
+            raise credentials_exception
+
+    token_cache.set(token, payload, principal, verified=verified)
+    return principal
+
+
+def make_introspection(payload: dict) -> TokenIntrospectionSchema:
+    return TokenIntrospectionSchema(
+        active=True,
+        token_type="Bearer",
+        sub=payload["sub"],
+        uid=payload.get("uid"),
+        username=payload.get("name"),
+        roles=payload.get("roles"),
+        exp=payload.get("exp"),
+        iat=payload.get("iat"),
+        jti=payload.get("jti"),
+    )
+
+
+async def introspect_tokens(
+    session: AsyncSession,
+    tokens: list[str],
+) -> list[TokenIntrospectionSchema]:
+    """
+    Check tokens in one pass: decode in process, then load owners
+    of tokens missing in cache by one query and check token versions.
+    """
+
+    inactive = TokenIntrospectionSchema(active=False)
+    results: list[TokenIntrospectionSchema] = [inactive] * len(tokens)
+    # Position of token in request: its claims, not yet checked against database
+    unchecked: dict[int, dict] = {}
+
+    for position, token in enumerate(tokens):
+        cached_token = token_cache.get(token)
+        if cached_token is not None:
+            payload = cached_token.claims
+        else:
+            try:
+                payload = key_ring.decode(token)
+            except InvalidTokenError:
+                continue
+            if payload.get("sub") is None:
+                continue
+        if await revocation_list.is_revoked(session, payload):
+            continue
+        # Principal built from claims is checked against database as well
+        if cached_token is not None and cached_token.verified:
+            if cached_token.principal.is_active:
+                results[position] = make_introspection(payload)
+        else:
+            unchecked[position] = payload
+
+    users = await fetch_users_by_emails(
+        session,
+        list({payload["sub"] for payload in unchecked.values()}),
+    )
+    for position, payload in unchecked.items():
+        user = users.get(payload["sub"])
+        if user is None or not user.is_active:
+            continue
+        if payload.get("ver", 0) != user.token_version:
+            continue
+        principal = UserPrincipalSchema.model_validate(user)
+        token_cache.set(tokens[position], payload, principal, verified=True)
+        results[position] = make_introspection(payload)
+    return results
+
+
+async def get_current_user(
+    session: CommonAsyncSession,
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> UserPrincipalSchema:
+    """Get current login user checked against database"""
+
+    return await resolve_principal(session, token, trust_claims=False)
+
+
+async def get_current_principal(
+    session: CommonAsyncSession,
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> UserPrincipalSchema:
+    """Get current login user from fresh token claims without database"""
+
+    return await resolve_principal(session, token, trust_claims=True)
+
+
+async def get_current_token_claims(
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> dict:
+    """Get verified claims of current token"""
+
+    cached_token = token_cache.get(token)
+    if cached_token is not None:
+        return cached_token.claims
+    try:
+        return key_ring.decode(token)
+    except InvalidTokenError:
+        raise credentials_exception
 
 
 async def get_current_active_user(
-    current_active_user: Annotated[User, Depends(get_current_user)],
-) -> Optional[User]:
+    current_active_user: Annotated[UserPrincipalSchema, Depends(get_current_principal)],
+) -> Optional[UserPrincipalSchema]:
     """Get current active login user"""
 
     if not current_active_user.is_active:
@@ -117,16 +485,18 @@ async def get_current_active_user(
 
 
 async def get_current_active_admin(
-    current_active_admin: Annotated[User, Depends(get_current_active_user)],
-) -> Optional[User]:
+    current_active_admin: Annotated[
+        UserPrincipalSchema, Depends(get_current_active_user)
+    ],
+) -> Optional[UserPrincipalSchema]:
     """Get current active login admin or super_admin"""
 
     is_contains_any_admin = any(
         [
             role in current_active_admin.roles
             for role in (
-                Role.admin,
-                Role.super_admin,
+                RoleSchema.admin,
+                RoleSchema.super_admin,
             )
         ]
     )
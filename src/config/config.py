@@ -1,5 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal, Optional
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -7,12 +8,34 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 env_file = Path(__file__).parent.parent / ".env"
 
 
+class PoolConfig(BaseModel):
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30
+    recycle: int = 1800
+    pre_ping: bool = True
+    prepared_statement_cache_size: int = 100
+    warm_up_size: Optional[int] = None
+
+
+class ReplicaConfig(BaseModel):
+    # Database URLs of read replicas, GET requests are served by them
+    urls: list[str] = []
+    max_lag_seconds: float = 5
+    check_interval_seconds: int = 5
+    check_timeout_seconds: float = 2
+
+
 class DatabaseConfig(BaseModel):
     user: str
     password: str
     host: str
     port: str
     name: str
+    # Compiled statements kept by SQLAlchemy, lookups reuse them
+    query_cache_size: int = 500
+    pool: PoolConfig = PoolConfig()
+    replicas: ReplicaConfig = ReplicaConfig()
 
     @property
     def url(self) -> str:
@@ -29,6 +52,104 @@ class AuthData(BaseModel):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 30
+    # Roles and active flag from younger tokens are trusted without database
+    claims_max_age_seconds: int = 300
+    # Directory with <kid>.pem private keys for asymmetric algorithms,
+    # <kid>.pub.pem files are public keys of retired signing keys
+    keys_dir: Optional[Path] = None
+    signing_kid: Optional[str] = None
+    jwks_max_age_seconds: int = 3600
+    introspection_max_tokens: int = 100
+    # Introspection result is cached not longer than remaining token lifetime
+    introspection_max_age_seconds: int = 60
+
+
+class HashingConfig(BaseModel):
+    executor: Literal["thread", "process"] = "thread"
+    max_workers: Optional[int] = None
+    max_queue_depth: int = 64
+    # Workers batch hashing can not take, so single jobs of logins do not wait
+    reserved_workers: int = 1
+    retry_after_seconds: int = 1
+    scheme: Literal["bcrypt", "argon2"] = "bcrypt"
+    # Cost is calibrated at startup to this time of one hash if it is set
+    target_ms: Optional[float] = None
+    bcrypt_rounds: int = 12
+    bcrypt_min_rounds: int = 10
+    bcrypt_max_rounds: int = 16
+    argon2_time_cost: int = 3
+    argon2_max_time_cost: int = 10
+    argon2_memory_cost: int = 65536
+    argon2_parallelism: int = 2
+
+
+class TokenCacheConfig(BaseModel):
+    enabled: bool = True
+    ttl_seconds: int = 60
+    max_entries: int = 10_000
+    max_bytes: int = 16 * 1024 * 1024
+
+
+class EmailLookupConfig(BaseModel):
+    # Login lookups of emails known to be missing skip database
+    enabled: bool = True
+    ttl_seconds: int = 30
+    max_entries: int = 100_000
+    # Changes of other workers drop missing emails and fill bloom filter
+    sync_interval_seconds: int = 5
+    sync_overlap_seconds: int = 60
+    # Bloom filter of all emails, worth it for credential stuffing traffic
+    bloom_enabled: bool = False
+    bloom_capacity: int = 1_000_000
+    bloom_error_rate: float = 0.01
+    bloom_rebuild_interval_seconds: int = 3600
+
+
+class LoggingConfig(BaseModel):
+    level: str = "INFO"
+    sql_echo: bool = False
+    json_format: bool = False
+    sample_rate: float = 1.0
+
+
+class MigrationConfig(BaseModel):
+    mode: Literal["run", "verify", "skip"] = "run"
+    lock_id: int = 89388
+
+
+class BulkImportConfig(BaseModel):
+    batch_size: int = 500
+    max_rows: int = 50_000
+
+
+class RateLimitConfig(BaseModel):
+    enabled: bool = True
+    store: Literal["memory", "redis"] = "memory"
+    redis_url: Optional[str] = None
+    # Addresses or networks of proxies which set X-Forwarded-For,
+    # client ip is taken from the header only behind them
+    trusted_proxies: list[str] = []
+    ip_limit: int = 30
+    ip_period_seconds: int = 60
+    username_limit: int = 10
+    username_period_seconds: int = 60
+    shards: int = 16
+    sweep_interval_seconds: int = 60
+
+
+class RevocationConfig(BaseModel):
+    bloom_capacity: int = 100_000
+    bloom_error_rate: float = 0.001
+    sync_interval_seconds: int = 5
+    # Sync reloads keys revoked this long before last sync, so keys
+    # committed after it started and clock skew of workers are covered
+    sync_overlap_seconds: int = 60
+    purge_interval_seconds: int = 3600
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
 
 
 class Settings(BaseSettings):
@@ -39,6 +160,15 @@ class Settings(BaseSettings):
     )
     db: DatabaseConfig
     auth: AuthData
+    hashing: HashingConfig = HashingConfig()
+    token_cache: TokenCacheConfig = TokenCacheConfig()
+    email_lookup: EmailLookupConfig = EmailLookupConfig()
+    logging: LoggingConfig = LoggingConfig()
+    migrations: MigrationConfig = MigrationConfig()
+    bulk_import: BulkImportConfig = BulkImportConfig()
+    rate_limit: RateLimitConfig = RateLimitConfig()
+    revocation: RevocationConfig = RevocationConfig()
+    metrics: MetricsConfig = MetricsConfig()
 
 
 @lru_cache
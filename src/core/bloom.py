@@ -0,0 +1,41 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Set membership with false positives and no false negatives.
+    Sized for capacity items at given false positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.size = max(
+            8,
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2),
+        )
+        self.hashes_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count = 0
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            (first + number * second) % self.size for number in range(self.hashes_count)
+        ]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
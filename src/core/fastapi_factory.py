@@ -7,15 +7,40 @@ from fastapi.responses import ORJSONResponse
 
 def create_app() -> FastAPI:
     from api.v1 import router as api_v1_router
+    from auth.emails import known_emails
+    from auth.hashing import hashing_executor
+    from auth.revocation import revocation_list
     from auth.routers import router as auth_router
-    from database.utils import alembic_upgrade_head
+    from config.config import settings
+    from database.database import engine, replica_set
+    from database.utils import run_migrations, warm_up_pool
+    from limiter.utils import login_rate_limiter
+    from monitoring.routers import metrics_router
+    from monitoring.routers import router as monitoring_router
+    from monitoring.utils import MetricsMiddleware, setup_metrics
 
     @asynccontextmanager
     async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-        is_successful_upgrade = alembic_upgrade_head()
+        is_successful_upgrade = await run_migrations(settings.migrations.mode)
         if not is_successful_upgrade:
             exit(1)
+        warm_up_size = settings.db.pool.warm_up_size
+        if warm_up_size is None:
+            warm_up_size = settings.db.pool.size
+        await warm_up_pool(engine, warm_up_size)
+        await replica_set.start()
+        hashing_executor.calibrate()
+        hashing_executor.start()
+        login_rate_limiter.start_sweeper()
+        await revocation_list.start()
+        await known_emails.start()
         yield
+        await known_emails.stop()
+        await revocation_list.stop()
+        await login_rate_limiter.stop_sweeper()
+        hashing_executor.shutdown()
+        await replica_set.stop()
+        await engine.dispose()
 
     fastapi_app = FastAPI(
         lifespan=lifespan,
@@ -30,5 +55,11 @@ def create_app() -> FastAPI:
 
     fastapi_app.include_router(api_v1_router)
     fastapi_app.include_router(auth_router)
+    fastapi_app.include_router(monitoring_router)
+
+    if settings.metrics.enabled:
+        setup_metrics(engine)
+        fastapi_app.add_middleware(MetricsMiddleware)
+        fastapi_app.include_router(metrics_router)
 
     return fastapi_app
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight call.
+    The first caller runs it, others wait for its result.
+    Result is shared between callers, so it must be immutable.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        while (future := self._calls.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                # Shield, so cancelled waiter does not cancel shared call
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # Caller running the call was cancelled, run it again
+
+        self.calls += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark exception retrieved, there may be no waiters
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
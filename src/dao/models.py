@@ -1,7 +1,8 @@
 import enum
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, Index, UniqueConstraint, func, text
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -36,7 +37,14 @@ class User(DatabaseModel):
     """Users table"""
 
     __tablename__ = "users"
-    __table_args__ = (UniqueConstraint("password_id"),)
+    __table_args__ = (
+        UniqueConstraint("password_id"),
+        # Indexes of users listing filters
+        Index("ix_users_roles", "roles", postgresql_using="gin"),
+        Index("ix_users_active_id", "id", postgresql_where="is_active"),
+        Index("ix_users_email_prefix", text("lower(email) text_pattern_ops")),
+        Index("ix_users_username_prefix", text("lower(username) text_pattern_ops")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[Optional[str]]
@@ -44,6 +52,15 @@ class User(DatabaseModel):
     roles: Mapped[list[Role]] = mapped_column(ARRAY(PgEnum(Role)))
 
     is_active: Mapped[bool] = mapped_column(default=True)
+    # Incremented on every change, tokens with other version are stale
+    token_version: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Watermark of workers syncing known emails
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        index=True,
+    )
     password_id: Mapped[int] = mapped_column(
         ForeignKey(
             "passwords.id",
@@ -56,8 +73,50 @@ class User(DatabaseModel):
         single_parent=True,
         cascade="all, delete-orphan",
         uselist=False,
-        lazy="selectin",
+        lazy="raise_on_sql",
     )
 
     def __repr__(self):
         return f"User <{self.username}>"
+
+
+class RefreshToken(DatabaseModel):
+    """Refresh tokens table, only hashes of tokens are stored"""
+
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    token_hash: Mapped[str] = mapped_column(unique=True)
+    family_id: Mapped[str] = mapped_column(index=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey(
+            "users.id",
+            ondelete="CASCADE",
+        ),
+        index=True,
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        index=True,
+    )
+    revoked: Mapped[bool] = mapped_column(default=False)
+
+
+class RevokedToken(DatabaseModel):
+    """
+    Revoked access tokens table.
+    Key is "jti:<jti>" for one token or "user:<id>" for all tokens
+    of user issued before revoked_at.
+    """
+
+    __tablename__ = "revoked_tokens"
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    revoked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        index=True,
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        index=True,
+    )
@@ -0,0 +1,230 @@
+import enum
+from typing import Optional
+
+from sqlalchemy import (
+    Integer,
+    Row,
+    Select,
+    String,
+    any_,
+    bindparam,
+    delete,
+    insert,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, raiseload
+
+from dao.models import Password, User
+
+
+class UserLoadProfile(enum.Enum):
+    """Which part of user row is loaded from database"""
+
+    # Columns of UserOutSchema only, password is never loaded
+    public = "public"
+    # Public columns with password hash joined in the same statement
+    auth = "auth"
+    # Whole row with password, needed for cascade delete
+    full = "full"
+
+
+_public_columns = load_only(
+    User.id,
+    User.username,
+    User.email,
+    User.roles,
+    User.is_active,
+    User.token_version,
+)
+
+USER_LOAD_OPTIONS = {
+    UserLoadProfile.public: (_public_columns, raiseload(User.password)),
+    UserLoadProfile.auth: (
+        _public_columns,
+        joinedload(User.password, innerjoin=True).load_only(
+            Password.hashed_password,
+        ),
+    ),
+    UserLoadProfile.full: (joinedload(User.password, innerjoin=True),),
+}
+
+
+def select_users(profile: UserLoadProfile = UserLoadProfile.public) -> Select:
+    """Make select of users loading only columns of given profile"""
+
+    return select(User).options(*USER_LOAD_OPTIONS[profile])
+
+
+def _make_lookups(column) -> dict[UserLoadProfile, Select]:
+    return {
+        profile: select_users(profile).where(column == bindparam("value"))
+        for profile in UserLoadProfile
+    }
+
+
+# Built once, so every lookup reuses statement with memoized cache key,
+# its compiled SQL and prepared statement of asyncpg connection
+USER_BY_ID = _make_lookups(User.id)
+USER_BY_EMAIL = _make_lookups(User.email)
+USER_BY_USERNAME = _make_lookups(User.username)
+USERS_BY_EMAILS = select_users().where(
+    User.email == any_(bindparam("emails", type_=ARRAY(String)))
+)
+
+
+async def _fetch_one(
+    session: AsyncSession,
+    stmt: Select,
+    value,
+) -> Optional[User]:
+    result = await session.execute(stmt, {"value": value})
+    return result.scalar_one_or_none()
+
+
+async def fetch_user_by_id(
+    session: AsyncSession,
+    id: int,
+    profile: UserLoadProfile = UserLoadProfile.public,
+) -> Optional[User]:
+    """Fetch user by id from database"""
+
+    return await _fetch_one(session, USER_BY_ID[profile], id)
+
+
+async def fetch_user_by_username(
+    session: AsyncSession,
+    username: str,
+    profile: UserLoadProfile = UserLoadProfile.public,
+) -> Optional[User]:
+    """Fetch user by username from database"""
+
+    return await _fetch_one(session, USER_BY_USERNAME[profile], username)
+
+
+async def fetch_user_by_email(
+    session: AsyncSession,
+    email: str,
+    profile: UserLoadProfile = UserLoadProfile.public,
+) -> Optional[User]:
+    """Fetch user by email from database"""
+
+    return await _fetch_one(session, USER_BY_EMAIL[profile], email)
+
+
+async def fetch_users_by_emails(
+    session: AsyncSession,
+    emails: list[str],
+) -> dict[str, User]:
+    """Fetch users with given emails in one query, keyed by email"""
+
+    if not emails:
+        return {}
+    result = await session.execute(USERS_BY_EMAILS, {"emails": emails})
+    return {user.email: user for user in result.scalars()}
+
+
+def _make_insert_user():
+    passwords, users = Password.__table__, User.__table__
+    new_password = (
+        insert(passwords)
+        .values(hashed_password=bindparam("hashed_password"))
+        .returning(passwords.c.id)
+        .cte("new_password")
+    )
+    return (
+        pg_insert(users)
+        .values(
+            username=bindparam("username"),
+            email=bindparam("email"),
+            roles=bindparam("roles", type_=users.c.roles.type),
+            is_active=True,
+            token_version=0,
+            password_id=select(new_password.c.id).scalar_subquery(),
+        )
+        .on_conflict_do_nothing(index_elements=[users.c.email])
+        .returning(
+            users.c.id,
+            users.c.username,
+            users.c.email,
+            users.c.roles,
+            users.c.is_active,
+        )
+    )
+
+
+# Password and user are inserted by one statement in one round trip
+INSERT_USER = _make_insert_user()
+
+
+async def insert_user(
+    session: AsyncSession,
+    username: Optional[str],
+    email: str,
+    roles: list,
+    hashed_password: str,
+) -> Optional[Row]:
+    """
+    Insert user with its password, return columns of new user
+    or None if user with such email exists.
+    Password is inserted anyway, so session must be rolled back on None.
+    """
+
+    result = await session.execute(
+        INSERT_USER,
+        {
+            "username": username,
+            "email": email,
+            "roles": roles,
+            "hashed_password": hashed_password,
+        },
+    )
+    return result.one_or_none()
+
+
+def _make_insert_users():
+    users = User.__table__
+    return (
+        pg_insert(users)
+        .on_conflict_do_nothing(index_elements=[users.c.email])
+        .returning(users.c.id, users.c.email, users.c.password_id)
+    )
+
+
+INSERT_PASSWORDS = insert(Password).returning(Password.id, sort_by_parameter_order=True)
+INSERT_USERS = _make_insert_users()
+DELETE_PASSWORDS = delete(Password.__table__).where(
+    Password.__table__.c.id == any_(bindparam("ids", type_=ARRAY(Integer)))
+)
+
+
+async def insert_users(
+    session: AsyncSession,
+    users: list[dict],
+    hashed_passwords: list[str],
+) -> dict[str, int]:
+    """
+    Insert users with their passwords skipping existing emails,
+    return ids of inserted users keyed by email.
+    Passwords of skipped users are deleted.
+    """
+
+    password_ids = await session.scalars(
+        INSERT_PASSWORDS,
+        [{"hashed_password": hashed} for hashed in hashed_passwords],
+    )
+    password_ids = password_ids.all()
+    result = await session.execute(
+        INSERT_USERS,
+        [
+            {**user, "password_id": password_id}
+            for user, password_id in zip(users, password_ids)
+        ],
+    )
+    rows = result.all()
+    orphan_ids = set(password_ids) - {row.password_id for row in rows}
+    if orphan_ids:
+        await session.execute(DELETE_PASSWORDS, {"ids": list(orphan_ids)})
+    return {row.email: row.id for row in rows}
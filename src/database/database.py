@@ -1,18 +1,64 @@
-from asyncio import current_task
+import time
+from contextlib import asynccontextmanager
 from typing import Annotated, AsyncIterator
 
-from fastapi import Depends
+from fastapi import Depends, Request
+from sqlalchemy import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
+    AsyncEngine,
     AsyncSession,
-    async_scoped_session,
     async_sessionmaker,
     create_async_engine,
 )
 
 from config.config import settings
+from database.replicas import ReplicaSet
 
-engine = create_async_engine(url=settings.db.url, echo=True)
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool which tracks time spent waiting for a connection"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_time = time.perf_counter() - started_at
+            self.wait_count += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+def make_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url=url,
+        poolclass=MonitoredQueuePool,
+        pool_size=settings.db.pool.size,
+        max_overflow=settings.db.pool.max_overflow,
+        pool_timeout=settings.db.pool.timeout,
+        pool_recycle=settings.db.pool.recycle,
+        pool_pre_ping=settings.db.pool.pre_ping,
+        query_cache_size=settings.db.query_cache_size,
+        connect_args={
+            "prepared_statement_cache_size": (
+                settings.db.pool.prepared_statement_cache_size
+            ),
+        },
+    )
+
+
+engine = make_engine(settings.db.url)
+replica_set = ReplicaSet(settings.db.replicas, make_engine)
+
+# Requests with these methods only read, so they may be served by replicas
+READ_METHODS = frozenset(("GET", "HEAD"))
 
 async_session = async_sessionmaker(
     bind=engine,
@@ -21,21 +67,35 @@ async_session = async_sessionmaker(
     class_=AsyncSession,
 )
 
-scoped_session = async_scoped_session(
-    session_factory=async_session,
-    scopefunc=current_task,
-)
 
+def get_read_engine() -> AsyncEngine:
+    """Get engine of healthy replica or primary engine"""
+    return replica_set.pick() or engine
 
-async def get_session() -> AsyncIterator[AsyncSession]:
-    """Async session generator"""
-    async with async_session() as session:
+
+async def get_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    Async session generator.
+    FastAPI caches it per request, so route and all its dependencies
+    share one session and at most one pool connection.
+    Reading requests are routed to replicas, others to primary.
+    """
+    bind = get_read_engine() if request.method in READ_METHODS else engine
+    async with async_session(bind=bind) as session:
         yield session
 
 
-async def get_scoped_session() -> AsyncIterator[AsyncSession]:
-    """Async scoped session generator"""
-    async with scoped_session() as session:
+@asynccontextmanager
+async def primary_session(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Yield given session unless it is bound to replica, then new session
+    of primary. For security checks which must see latest changes.
+    """
+
+    if not replica_set.is_replica(session.bind):
+        yield session
+        return
+    async with async_session(bind=engine) as session:
         yield session
 
 
@@ -46,5 +106,4 @@ async def get_engine() -> AsyncIterator[AsyncConnection]:
 
 
 CommonAsyncSession = Annotated[AsyncSession, Depends(get_session)]
-CommonAsyncScopedSession = Annotated[AsyncSession, Depends(get_scoped_session)]
 CommonAsyncEngine = Annotated[AsyncConnection, Depends(get_engine)]
@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.config import ReplicaConfig
+from loggers.loggers import logger
+
+# Seconds replica is behind primary, zero if it replayed all received WAL,
+# so idle primary does not make replicas look lagging.
+# NULL if WAL receiver is not streaming, then received WAL may be stale.
+# Status is NULL for roles without pg_read_all_stats, running receiver is trusted.
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver
+            WHERE COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.name = "{}:{}/{}".format(
+            engine.url.host,
+            engine.url.port,
+            engine.url.database,
+        )
+        self.healthy = True
+        self.lag: Optional[float] = None
+
+
+class ReplicaSet:
+    """
+    Read replicas picked round-robin among healthy ones.
+    Replica is unhealthy if it is unreachable or lags more than
+    max_lag_seconds, reads fall back to primary if none is healthy.
+    """
+
+    def __init__(
+        self,
+        config: ReplicaConfig,
+        make_engine: Callable[[str], AsyncEngine],
+    ) -> None:
+        self.config = config
+        self.replicas = [Replica(make_engine(url)) for url in config.urls]
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Get engine of next healthy replica or None"""
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].engine
+
+    def is_replica(self, bind) -> bool:
+        return any(replica.engine is bind for replica in self.replicas)
+
+    async def check_replica(self, replica: Replica) -> None:
+        was_healthy = replica.healthy
+        try:
+            async with asyncio.timeout(self.config.check_timeout_seconds):
+                async with replica.engine.connect() as connection:
+                    lag = await connection.scalar(LAG_QUERY)
+        except Exception as exc:
+            replica.healthy, replica.lag = False, None
+            if was_healthy:
+                logger.warning("Replica %s is unreachable: %r", replica.name, exc)
+            return
+
+        if lag is None:
+            replica.healthy, replica.lag = False, None
+            if was_healthy:
+                logger.warning("Replica %s does not stream WAL.", replica.name)
+            return
+        lag = float(lag)
+        replica.lag = lag
+        replica.healthy = lag <= self.config.max_lag_seconds
+        if replica.healthy != was_healthy:
+            logger.warning(
+                "Replica %s is %s, lag %.1f s.",
+                replica.name,
+                "healthy" if replica.healthy else "lagging",
+                lag,
+            )
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self.check_replica(r) for r in self.replicas))
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.check_interval_seconds)
+            await self.check()
+
+    async def start(self) -> None:
+        if not self.replicas:
+            return
+        await self.check()
+        if self._task is None:
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
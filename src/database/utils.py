@@ -1,27 +1,112 @@
-import subprocess
+from contextlib import AsyncExitStack
 from pathlib import Path
 
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from config.config import settings
+from database.database import MonitoredQueuePool, engine
 from loggers.loggers import logger
+from monitoring.schemas import PoolStatsSchema
 
+alembic_work_dir = Path(__file__).parent.parent.resolve()
 
-def alembic_upgrade_head() -> bool:
-    """Run alembic upgrade with shell-command"""
 
-    alembic_upgrade_command = "alembic upgrade head"
-    alembic_work_dir = Path(__file__).parent.parent.resolve().as_posix()
+def get_alembic_config() -> Config:
+    """Make alembic config independent of current working directory"""
 
-    with subprocess.Popen(
-        alembic_upgrade_command,
-        shell=True,
-        cwd=alembic_work_dir,
-    ) as proc:
-        pass
-    exit_code = proc.returncode
+    alembic_config = Config((alembic_work_dir / "alembic.ini").as_posix())
+    alembic_config.set_main_option(
+        "script_location",
+        (alembic_work_dir / "alembic").as_posix(),
+    )
+    return alembic_config
 
-    if exit_code != 0:
-        logger.error("Alembic upgrade error.")
-        return False
 
-    else:
-        logger.info("Alembic upgrade too head successful.")
+def get_current_revisions(connection: Connection) -> set[str]:
+    migration_context = MigrationContext.configure(connection)
+    return set(migration_context.get_current_heads())
+
+
+def upgrade_head(connection: Connection, alembic_config: Config) -> None:
+    alembic_config.attributes["connection"] = connection
+    command.upgrade(alembic_config, "head")
+
+
+async def run_migrations(mode: str) -> bool:
+    """
+    Bring database to alembic head according to mode:
+    run - upgrade under advisory lock, so only one worker migrates;
+    verify - only check that database is at head;
+    skip - do nothing.
+    """
+
+    if mode == "skip":
+        logger.info("Alembic migrations skipped.")
         return True
+
+    alembic_config = get_alembic_config()
+    head_revisions = set(ScriptDirectory.from_config(alembic_config).get_heads())
+
+    try:
+        async with engine.begin() as connection:
+            if mode == "run":
+                await connection.execute(
+                    text("SELECT pg_advisory_xact_lock(:lock_id)"),
+                    {"lock_id": settings.migrations.lock_id},
+                )
+            current_revisions = await connection.run_sync(get_current_revisions)
+            if current_revisions == head_revisions:
+                logger.info("Database is at alembic head.")
+                return True
+            if mode == "verify":
+                logger.error(
+                    "Database revisions %s differ from alembic head %s.",
+                    current_revisions,
+                    head_revisions,
+                )
+                return False
+            await connection.run_sync(upgrade_head, alembic_config)
+    except Exception:
+        logger.exception("Alembic upgrade error.")
+        return False
+
+    logger.info("Alembic upgrade too head successful.")
+    return True
+
+
+async def warm_up_pool(
+    async_engine: AsyncEngine,
+    connections_count: int,
+) -> None:
+    """Open given count of pool connections at once and return them to pool"""
+
+    async with AsyncExitStack() as stack:
+        for _ in range(connections_count):
+            connection = await stack.enter_async_context(async_engine.connect())
+            await connection.execute(text("SELECT 1"))
+    logger.info("Database pool warmed up with %s connections.", connections_count)
+
+
+def get_pool_stats() -> PoolStatsSchema:
+    """Get usage of engine connection pool"""
+
+    pool = engine.pool
+    pool_stats = PoolStatsSchema(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=pool.overflow(),
+        wait_count=0,
+        wait_time_total=0.0,
+        wait_time_max=0.0,
+    )
+    if isinstance(pool, MonitoredQueuePool):
+        pool_stats.wait_count = pool.wait_count
+        pool_stats.wait_time_total = pool.wait_time_total
+        pool_stats.wait_time_max = pool.wait_time_max
+    return pool_stats
@@ -1,10 +1,62 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from config.config import settings
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class TokenData(BaseModel):
     user_email: str | None = None
+
+
+class TokenClaimsSchema(BaseModel):
+    """Claims about user carried by access token"""
+
+    sub: str
+    uid: int
+    name: Optional[str] = None
+    roles: list[str]
+    active: bool
+    ver: int
+    iat: int
+
+
+class TokenCacheStatsSchema(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class TokenIntrospectRequestSchema(BaseModel):
+    tokens: list[str] = Field(
+        min_length=1,
+        max_length=settings.auth.introspection_max_tokens,
+    )
+
+
+class TokenIntrospectionSchema(BaseModel):
+    """State of one token as in RFC 7662, only active is set for inactive token"""
+
+    active: bool
+    token_type: Optional[str] = None
+    sub: Optional[str] = None
+    uid: Optional[int] = None
+    username: Optional[str] = None
+    roles: Optional[list[str]] = None
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+    jti: Optional[str] = None
+
+
+class TokenIntrospectResponseSchema(BaseModel):
+    """States of tokens in order of request"""
+
+    results: list[TokenIntrospectionSchema]
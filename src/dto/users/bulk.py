@@ -0,0 +1,223 @@
+import csv
+import json
+from typing import AsyncIterator, Optional, Union
+
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.emails import remember_email
+from auth.utils import get_password_hashes
+from config.config import settings
+from dao.users import fetch_users_by_emails, insert_users
+from dto.users.schemas import (
+    BulkUserReportSchema,
+    BulkUserResultSchema,
+    UserCreateSchema,
+)
+
+# Roles in one CSV cell are separated with this symbol
+CSV_ROLES_SEPARATOR = ";"
+
+unsupported_media_type_exception = HTTPException(
+    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+    detail="Use application/json, application/x-ndjson or text/csv",
+)
+
+too_many_rows_exception = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail="Rows limit of {} exceeded".format(settings.bulk_import.max_rows),
+)
+
+
+def decode_line(line: bytes) -> Union[str, bytes]:
+    """Decode line of body, line which is not UTF-8 is left as bytes"""
+
+    try:
+        return line.decode()
+    except UnicodeDecodeError:
+        return line
+
+
+async def iter_lines(request: Request) -> AsyncIterator[Union[str, bytes]]:
+    """Yield decoded lines of request body as chunks arrive"""
+
+    tail = b""
+    async for chunk in request.stream():
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield decode_line(line)
+    if tail:
+        yield decode_line(tail)
+
+
+async def iter_raw_users(request: Request) -> AsyncIterator[object]:
+    """
+    Yield raw user objects from JSON array, NDJSON or CSV body.
+    Lines which can not be parsed are yielded as they are to be reported invalid.
+    """
+
+    content_type = request.headers.get("content-type", "").split(";")[0]
+
+    if content_type == "application/json":
+        try:
+            raw_users = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(raw_users, list):
+            raise HTTPException(status_code=400, detail="Expected JSON array")
+        if len(raw_users) > settings.bulk_import.max_rows:
+            raise too_many_rows_exception
+        for raw_user in raw_users:
+            yield raw_user
+
+    elif content_type == "application/x-ndjson":
+        async for line in iter_lines(request):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line
+
+    elif content_type == "text/csv":
+        header: Optional[list[str]] = None
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            if isinstance(line, bytes):
+                if header is None:
+                    raise HTTPException(status_code=400, detail="Invalid CSV header")
+                yield line
+                continue
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            raw_user = dict(zip(header, values))
+            if "roles" in raw_user:
+                raw_user["roles"] = [
+                    role
+                    for role in raw_user["roles"].split(CSV_ROLES_SEPARATOR)
+                    if role
+                ]
+            yield raw_user
+
+    else:
+        raise unsupported_media_type_exception
+
+
+def duplicate_result(row: int, user: UserCreateSchema) -> BulkUserResultSchema:
+    return BulkUserResultSchema(
+        row=row,
+        email=user.email,
+        status="duplicate",
+        detail="User with such email already exist",
+    )
+
+
+async def import_users_batch(
+    session: AsyncSession,
+    batch: list[tuple[int, UserCreateSchema]],
+) -> list[BulkUserResultSchema]:
+    """
+    Insert and commit batch of valid users skipping duplicated emails.
+    Passwords are hashed in parallel, passwords and users are inserted
+    with one multi-row INSERT ... RETURNING each.
+    """
+
+    results = []
+    new_users: list[tuple[int, UserCreateSchema]] = []
+    batch_emails: set[str] = set()
+    existing_users = await fetch_users_by_emails(
+        session,
+        [user.email for _, user in batch],
+    )
+    for row, user in batch:
+        if user.email in existing_users or user.email in batch_emails:
+            results.append(duplicate_result(row, user))
+            continue
+        batch_emails.add(user.email)
+        new_users.append((row, user))
+    # Connection is not held idle in transaction while passwords are hashed
+    await session.commit()
+
+    if not new_users:
+        return results
+
+    hashed_passwords = await get_password_hashes(
+        [user.password for _, user in new_users]
+    )
+    # Users inserted concurrently since check above are skipped by database
+    user_ids = await insert_users(
+        session,
+        [user.model_dump(exclude={"password"}) for _, user in new_users],
+        hashed_passwords,
+    )
+    await session.commit()
+    for row, user in new_users:
+        user_id = user_ids.get(user.email)
+        if user_id is None:
+            results.append(duplicate_result(row, user))
+            continue
+        remember_email(user.email)
+        results.append(
+            BulkUserResultSchema(
+                row=row,
+                email=user.email,
+                status="created",
+                id=user_id,
+            )
+        )
+    return results
+
+
+async def import_users(
+    session: AsyncSession,
+    request: Request,
+) -> BulkUserReportSchema:
+    """
+    Validate and insert users from request body batch by batch.
+    Every batch is committed, so transaction never outgrows one batch.
+    Reading stops at rows limit, rows before it are imported and reported.
+    """
+
+    results: list[BulkUserResultSchema] = []
+    batch: list[tuple[int, UserCreateSchema]] = []
+    row = 0
+    rows_limit_exceeded = False
+
+    async for raw_user in iter_raw_users(request):
+        row += 1
+        if row > settings.bulk_import.max_rows:
+            rows_limit_exceeded = True
+            break
+        try:
+            user = UserCreateSchema.model_validate(raw_user)
+        except ValidationError as exc:
+            email = raw_user.get("email") if isinstance(raw_user, dict) else None
+            results.append(
+                BulkUserResultSchema(
+                    row=row,
+                    email=email if isinstance(email, str) else None,
+                    status="invalid",
+                    detail=str(exc),
+                )
+            )
+            continue
+        batch.append((row, user))
+        if len(batch) >= settings.bulk_import.batch_size:
+            results.extend(await import_users_batch(session, batch))
+            batch = []
+
+    if batch:
+        results.extend(await import_users_batch(session, batch))
+
+    results.sort(key=lambda result: result.row)
+    created = sum(1 for result in results if result.status == "created")
+    return BulkUserReportSchema(
+        created=created,
+        failed=len(results) - created,
+        rows_limit_exceeded=rows_limit_exceeded,
+        results=results,
+    )
@@ -1,25 +1,49 @@
 from pathlib import Path
 from typing import Annotated, Optional, Sequence
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from auth.cache import token_cache
+from auth.emails import remember_email
 from auth.utils import (
     get_current_active_admin,
     get_current_active_user,
     get_current_user,
+    get_password_hash,
+    revoke_user_tokens,
 )
-from dao.models import Password, User, Role
+from dao.models import User, Role
+from dao.users import UserLoadProfile, fetch_user_by_id, insert_user
 from database.database import CommonAsyncSession
-from dto.passwords.utils import create_password_instance
+from dto.users.bulk import import_users
 from dto.users.schemas import (
+    BulkUserReportSchema,
     DeleteConfirmSchema,
     ErrorDetailSchema,
     UserCreateSchema,
+    UserFilterSchema,
     UserOutSchema,
+    UserPrincipalSchema,
     UserUpdateSchema,
 )
-from dto.users.utils import fetch_all_users, fetch_user_by_id, fetch_user_by_email
+from dto.users.serializers import dump_user_row_line, dump_user_rows
+from dto.users.utils import (
+    decode_cursor,
+    encode_cursor,
+    fetch_users_page,
+    load_principal_by_id,
+    stream_users,
+)
 
 
 router = APIRouter(
@@ -35,7 +59,7 @@ user_not_found_exception = HTTPException(
 
 @router.get("/me", response_model=UserOutSchema)
 async def get_profile_of_logging_user(
-    current_user: Annotated[User, Depends(get_current_user)],
+    current_user: Annotated[UserPrincipalSchema, Depends(get_current_user)],
 ):
     """Get logging user"""
 
@@ -47,6 +71,11 @@ async def get_profile_of_logging_user(
     dependencies=[Depends(get_current_active_user)],
     response_model=list[UserOutSchema],
     responses={
+        200: {
+            "description": "Users page. Next page cursor in X-Next-Cursor "
+            "header. With stream=true body is NDJSON.",
+            "content": {"application/x-ndjson": {}},
+        },
         404: {
             "description": "Users not found",
             "model": ErrorDetailSchema,
@@ -55,13 +84,38 @@ async def get_profile_of_logging_user(
 )
 async def get_all_users(
     session: CommonAsyncSession,
-) -> Sequence[User]:
-    """Get all users from database"""
+    filters: Annotated[UserFilterSchema, Depends()],
+    after_id: Annotated[int, Query(ge=0)] = 0,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    stream: bool = False,
+):
+    """
+    Get users from database ordered by id, page by page or as stream.
+    Users can be filtered by role, active status and email or username prefix.
+    """
+
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
 
-    users_orm = await fetch_all_users(session)
-    if not users_orm:
+    if stream:
+        return StreamingResponse(
+            (dump_user_row_line(row) async for row in stream_users(after_id, filters)),
+            media_type="application/x-ndjson",
+        )
+
+    rows = await fetch_users_page(session, after_id, limit, filters)
+    if not rows and not after_id:
         raise user_not_found_exception
-    return users_orm
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+    # Rows are dumped straight to JSON, response_model documents them only
+    return Response(
+        content=dump_user_rows(rows),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get(
@@ -72,10 +126,10 @@ async def get_all_users(
 async def get_user_by_id(
     session: CommonAsyncSession,
     user_id: int,
-) -> Optional[User]:
+) -> Optional[UserPrincipalSchema]:
     """Get user by id from database"""
 
-    user = await fetch_user_by_id(session, user_id)
+    user = await load_principal_by_id(session, user_id)
     if not user:
         raise user_not_found_exception
     return user
@@ -96,25 +150,68 @@ async def get_user_by_id(
 async def add_new_user(
     session: CommonAsyncSession,
     user: UserCreateSchema,
-) -> Optional[User]:
+) -> UserOutSchema:
     """Add new user to database"""
 
-    user_in_db = await fetch_user_by_email(session, user.email)
-    if user_in_db:
+    hashed_password = await get_password_hash(user.password)
+    new_user = await insert_user(
+        session,
+        username=user.username,
+        email=user.email,
+        roles=user.roles,
+        hashed_password=hashed_password,
+    )
+    if new_user is None:
+        await session.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="User with such email already exist",
         )
-    new_password_orm: Password = await create_password_instance(
-        user.password,
-    )
-    session.add(new_password_orm)
-    await session.flush()
-    new_user_orm = User(**user.model_dump(exclude={"password"}))
-    new_user_orm.password_id = new_password_orm.id
-    session.add(new_user_orm)
     await session.commit()
-    return new_user_orm
+    remember_email(new_user.email)
+    return UserOutSchema.model_validate(new_user)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Depends(get_current_active_admin)],
+    response_model=BulkUserReportSchema,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/UserCreateSchema"},
+                    },
+                },
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/UserCreateSchema"},
+                },
+                "text/csv": {
+                    "schema": {"type": "string"},
+                    "example": "username,email,roles,password\n"
+                    "Bob,bob@example.com,user;teacher,0987654321",
+                },
+            },
+        },
+    },
+)
+async def add_new_users(
+    session: CommonAsyncSession,
+    request: Request,
+    response: Response,
+) -> BulkUserReportSchema:
+    """
+    Add many users to database from JSON array, NDJSON or CSV body.
+    Returns result for every row, with status 413 if rows limit is exceeded.
+    """
+
+    report = await import_users(session, request)
+    if report.rows_limit_exceeded:
+        response.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    return report
 
 
 @router.patch(
@@ -142,7 +239,12 @@ async def update_partial_user(
 
     for name, value in updated_user.model_dump(exclude_unset=True).items():
         setattr(user, name, value)
+    user.token_version += 1
+    if not user.is_active:
+        await revoke_user_tokens(session, user.id)
     await session.commit()
+    token_cache.invalidate_user(user.id)
+    remember_email(user.email)
     return user
 
 
@@ -157,7 +259,7 @@ async def delete_user(
 ) -> dict[str, str]:
     """Delete user from database"""
 
-    user = await fetch_user_by_id(session, user_id)
+    user = await fetch_user_by_id(session, user_id, UserLoadProfile.full)
     if not user:
         raise user_not_found_exception
 
@@ -167,6 +269,28 @@ async def delete_user(
             detail="Can not delete super_admin",
         )
 
+    await revoke_user_tokens(session, user_id)
     await session.delete(user)
     await session.commit()
+    token_cache.invalidate_user(user_id)
     return {"deleted": "True"}
+
+
+@router.post(
+    "/{user_id}/sign-out",
+    dependencies=[Depends(get_current_active_admin)],
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def sign_out_user(
+    session: CommonAsyncSession,
+    user_id: int,
+):
+    """Revoke all tokens issued to user, so user has to login again"""
+
+    user = await fetch_user_by_id(session, user_id)
+    if not user:
+        raise user_not_found_exception
+
+    await revoke_user_tokens(session, user_id)
+    await session.commit()
+    token_cache.invalidate_user(user_id)
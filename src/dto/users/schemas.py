@@ -1,5 +1,5 @@
 import enum
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 
@@ -38,6 +38,15 @@ class UserUpdateSchema(BaseModel):
     is_active: Optional[bool] = None
 
 
+class UserFilterSchema(BaseModel):
+    """Filters of users listing, prefixes are case insensitive"""
+
+    role: Optional[RoleSchema] = None
+    is_active: Optional[bool] = None
+    email_prefix: Optional[str] = Field(default=None, min_length=1)
+    username_prefix: Optional[str] = Field(default=None, min_length=1)
+
+
 class UserOutSchema(UserBaseSchema):
     model_config = ConfigDict(from_attributes=True)
 
@@ -45,6 +54,30 @@ class UserOutSchema(UserBaseSchema):
     is_active: bool
 
 
+class UserPrincipalSchema(UserOutSchema):
+    """Lightweight authenticated user, safe to keep outside a session"""
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    token_version: int = 0
+
+
+class BulkUserResultSchema(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: Literal["created", "duplicate", "invalid"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkUserReportSchema(BaseModel):
+    created: int
+    failed: int
+    # Rows after limit were not read, response status is 413
+    rows_limit_exceeded: bool = False
+    results: list[BulkUserResultSchema]
+
+
 class DeleteConfirmSchema(BaseModel):
     deleted: bool
 
@@ -0,0 +1,37 @@
+from typing import Iterable
+
+import orjson
+from sqlalchemy import Row, Select, select
+
+from dao.models import User
+from dto.users.schemas import UserOutSchema
+
+# Columns are selected in order of UserOutSchema fields,
+# so row tuples are zipped with field names into response dicts
+USER_OUT_FIELDS = tuple(UserOutSchema.model_fields)
+USER_OUT_COLUMNS = tuple(getattr(User, field) for field in USER_OUT_FIELDS)
+
+
+def select_user_rows() -> Select:
+    """Make select of UserOutSchema columns returning plain rows"""
+
+    return select(*USER_OUT_COLUMNS)
+
+
+def dump_user_rows(rows: Iterable[Row]) -> bytes:
+    """
+    Serialize rows to JSON array of UserOutSchema without validation.
+    Rows come from database constrained as schema, roles enums are
+    dumped by orjson as their values.
+    """
+
+    return orjson.dumps([dict(zip(USER_OUT_FIELDS, row)) for row in rows])
+
+
+def dump_user_row_line(row: Row) -> bytes:
+    """Serialize row to NDJSON line of UserOutSchema"""
+
+    return orjson.dumps(
+        dict(zip(USER_OUT_FIELDS, row)),
+        option=orjson.OPT_APPEND_NEWLINE,
+    )
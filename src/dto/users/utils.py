@@ -1,54 +1,146 @@
-from typing import Annotated, Optional, Sequence
+import base64
+import binascii
+import json
+from typing import Annotated, AsyncIterator, Optional, Sequence
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import Row, Select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.schemas import oauth2_scheme
+from core.singleflight import SingleFlight
 from dao.models import User
-from database.database import CommonAsyncScopedSession
+from dao.users import fetch_user_by_email, fetch_user_by_id
+from database.database import CommonAsyncSession, async_session, get_read_engine
+from dto.users.schemas import UserFilterSchema, UserPrincipalSchema
+from dto.users.serializers import select_user_rows
 
+STREAM_BATCH_SIZE = 500
 
-async def fetch_all_users(session: AsyncSession) -> Sequence[User]:
-    """Fetch all users from database"""
+# Concurrent lookups of the same user in this worker share one query
+user_lookups = SingleFlight("user_lookups")
 
-    stmt = select(User).order_by(User.id)
-    result = await session.execute(stmt)
-    users = result.scalars().all()
-    return users
+
+invalid_cursor_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid cursor",
+)
+
+
+def encode_cursor(last_id: int) -> str:
+    """Make opaque cursor pointing after given user id"""
+
+    raw_cursor = json.dumps({"after_id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw_cursor).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """Get user id from opaque cursor"""
+
+    try:
+        raw_cursor = base64.urlsafe_b64decode(cursor.encode())
+        after_id = json.loads(raw_cursor)["after_id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise invalid_cursor_exception
+    if not isinstance(after_id, int) or after_id < 0:
+        raise invalid_cursor_exception
+    return after_id
+
+
+def filter_users(stmt: Select, filters: Optional[UserFilterSchema]) -> Select:
+    """Add conditions of given filters to select of users"""
+
+    if filters is None:
+        return stmt
+    if filters.role is not None:
+        stmt = stmt.where(User.roles.contains([filters.role]))
+    if filters.is_active is not None:
+        # Equality, so partial index on active users can be used
+        stmt = stmt.where(User.is_active == filters.is_active)
+    # lower() matches expression of prefix indexes
+    if filters.email_prefix is not None:
+        stmt = stmt.where(
+            func.lower(User.email).startswith(
+                filters.email_prefix.lower(),
+                autoescape=True,
+            )
+        )
+    if filters.username_prefix is not None:
+        stmt = stmt.where(
+            func.lower(User.username).startswith(
+                filters.username_prefix.lower(),
+                autoescape=True,
+            )
+        )
+    return stmt
 
 
-async def fetch_user_by_id(
+async def fetch_users_page(
     session: AsyncSession,
-    id: int,
-) -> Optional[User]:
-    """Fetch user by id from database"""
+    after_id: int = 0,
+    limit: int = 100,
+    filters: Optional[UserFilterSchema] = None,
+) -> Sequence[Row]:
+    """Fetch rows of filtered users with id greater than after_id from database"""
 
-    stmt = select(User).where(User.id == id)
+    stmt = filter_users(select_user_rows(), filters)
+    stmt = stmt.where(User.id > after_id).order_by(User.id).limit(limit)
     result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
-    return user
+    return result.all()
+
+
+async def stream_users(
+    after_id: int = 0,
+    filters: Optional[UserFilterSchema] = None,
+) -> AsyncIterator[Row]:
+    """
+    Yield rows of filtered users with id greater than after_id as they arrive.
+    Uses own session on replica because it outlives request dependencies.
+    """
+
+    stmt = (
+        filter_users(select_user_rows(), filters)
+        .where(User.id > after_id)
+        .order_by(User.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    async with async_session(bind=get_read_engine()) as session:
+        result = await session.stream(stmt)
+        async for row in result:
+            yield row
+
+
+async def _load_principal(
+    session: AsyncSession, fetch, key
+) -> Optional[UserPrincipalSchema]:
+    user = await fetch(session, key)
+    return UserPrincipalSchema.model_validate(user) if user else None
 
 
-async def fetch_user_by_username(
+def _lookup_key(session: AsyncSession, kind: str, value) -> tuple:
+    # Lookups on primary do not wait for ones on possibly lagging replica
+    return kind, value, session.bind
+
+
+async def load_principal_by_id(
     session: AsyncSession,
-    username: str,
-) -> Optional[User]:
-    """Fetch user by username from database"""
+    id: int,
+) -> Optional[UserPrincipalSchema]:
+    """Load user by id, sharing query with concurrent lookups of it"""
 
-    stmt = select(User).where(User.username == username)
-    result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
-    return user
+    return await user_lookups.do(
+        _lookup_key(session, "id", id),
+        lambda: _load_principal(session, fetch_user_by_id, id),
+    )
 
 
-async def fetch_user_by_email(
+async def load_principal_by_email(
     session: AsyncSession,
     email: str,
-) -> Optional[User]:
-    """Fetch user by email from database"""
+) -> Optional[UserPrincipalSchema]:
+    """Load user by email, sharing query with concurrent lookups of it"""
 
-    stmt = select(User).where(User.email == email)
-    result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
-    return user
+    return await user_lookups.do(
+        _lookup_key(session, "email", email),
+        lambda: _load_principal(session, fetch_user_by_email, email),
+    )
@@ -0,0 +1,120 @@
+import time
+import zlib
+from typing import Any, Optional, Protocol
+
+from config.config import RateLimitConfig
+
+# Token bucket in GCRA form: bucket state is one "theoretical arrival time".
+# Returns seconds to wait, "0" when request is allowed.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local tat = tonumber(redis.call("GET", KEYS[1]) or ARGV[1])
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+redis.call("SET", KEYS[1], tostring(new_tat), "PX", math.ceil((new_tat - now) * 1000))
+return "0"
+"""
+
+
+def take_token(
+    tat: Optional[float],
+    now: float,
+    limit: int,
+    period: float,
+) -> tuple[float, float]:
+    """
+    Take one token from bucket of given limit refilled over period.
+    Returns new bucket state and seconds to wait, 0 when allowed.
+    """
+
+    interval = period / limit
+    new_tat = max(tat or now, now) + interval
+    allow_at = new_tat - period
+    if now < allow_at:
+        return max(tat or now, now), allow_at - now
+    return new_tat, 0.0
+
+
+class RateLimitStore(Protocol):
+    async def take(self, key: str, limit: int, period: float) -> float: ...
+
+    async def sweep(self) -> None: ...
+
+
+class InMemoryStore:
+    """
+    Buckets of single process in sharded dicts.
+    One float per key, full buckets are dropped by sweep shard by shard.
+    """
+
+    def __init__(self, shards: int = 16) -> None:
+        self.shards: list[dict[str, float]] = [{} for _ in range(shards)]
+        self._next_shard = 0
+
+    def _shard(self, key: str) -> dict[str, float]:
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    async def take(self, key: str, limit: int, period: float) -> float:
+        shard = self._shard(key)
+        now = time.monotonic()
+        shard[key], retry_after = take_token(shard.get(key), now, limit, period)
+        return retry_after
+
+    async def sweep(self) -> None:
+        """Drop refilled buckets of the next shard"""
+
+        shard = self.shards[self._next_shard]
+        self._next_shard = (self._next_shard + 1) % len(self.shards)
+        now = time.monotonic()
+        for key in [key for key, tat in shard.items() if tat <= now]:
+            del shard[key]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+
+class RedisStore:
+    """
+    Buckets shared by all workers in Redis-compatible server.
+    Client must provide async eval, keys expire by themselves.
+    """
+
+    def __init__(self, client: Any, prefix: str = "ratelimit:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, limit: int, period: float) -> float:
+        retry_after = await self.client.eval(
+            TOKEN_BUCKET_SCRIPT,
+            1,
+            self.prefix + key,
+            repr(time.time()),
+            repr(period / limit),
+            repr(float(period)),
+        )
+        if isinstance(retry_after, bytes):
+            retry_after = retry_after.decode()
+        return float(retry_after)
+
+    async def sweep(self) -> None:
+        pass
+
+
+def make_store(config: RateLimitConfig) -> RateLimitStore:
+    if config.store == "redis":
+        if not config.redis_url:
+            raise ValueError("RATE_LIMIT__REDIS_URL is required for redis store")
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise ImportError("redis package is required for redis store") from exc
+        return RedisStore(redis.from_url(config.redis_url))
+    return InMemoryStore(config.shards)
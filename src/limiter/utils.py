@@ -0,0 +1,112 @@
+import asyncio
+import ipaddress
+import math
+from typing import Annotated, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+
+from auth.schemas import OAuth2TokenRequestForm
+from config.config import RateLimitConfig, settings
+from limiter.stores import RateLimitStore, make_store
+from loggers.loggers import logger
+
+
+class LoginRateLimiter:
+    """Limits login attempts per client ip and per username"""
+
+    def __init__(self, config: RateLimitConfig) -> None:
+        self.config = config
+        self.store: RateLimitStore = make_store(config)
+        self.trusted_proxies = [
+            ipaddress.ip_network(proxy) for proxy in config.trusted_proxies
+        ]
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def is_trusted_proxy(self, host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_ip(
+        self, host: Optional[str], forwarded_for: Optional[str]
+    ) -> Optional[str]:
+        """
+        Get client ip from peer address and X-Forwarded-For header.
+        Header is walked from the right while hops are trusted proxies,
+        so client can not spoof its ip by sending the header itself.
+        """
+
+        if not host or not forwarded_for or not self.is_trusted_proxy(host):
+            return host
+        for hop in reversed(forwarded_for.split(",")):
+            host = hop.strip()
+            if not self.is_trusted_proxy(host):
+                break
+        return host
+
+    async def check(self, ip: Optional[str], username: Optional[str]) -> float:
+        """
+        Take tokens for ip and username, return seconds to wait.
+        Username bucket is not charged for ip over its limit, so blocked
+        client can not lock other users out.
+        """
+
+        if ip:
+            retry_after = await self.store.take(
+                f"ip:{ip}",
+                self.config.ip_limit,
+                self.config.ip_period_seconds,
+            )
+            if retry_after > 0:
+                return retry_after
+        if username:
+            return await self.store.take(
+                f"user:{username.lower()}",
+                self.config.username_limit,
+                self.config.username_period_seconds,
+            )
+        return 0.0
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.sweep_interval_seconds)
+            try:
+                await self.store.sweep()
+            except Exception:
+                logger.exception("Rate limit store sweep error.")
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+
+login_rate_limiter = LoginRateLimiter(settings.rate_limit)
+
+
+async def limit_login_attempts(
+    request: Request,
+    form_data: Annotated[OAuth2TokenRequestForm, Depends()],
+) -> None:
+    """Reject login before password is checked if limit is exceeded"""
+
+    if not settings.rate_limit.enabled:
+        return
+
+    ip = login_rate_limiter.client_ip(
+        request.client.host if request.client else None,
+        request.headers.get("x-forwarded-for"),
+    )
+    retry_after = await login_rate_limiter.check(ip, form_data.username)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
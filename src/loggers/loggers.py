@@ -1,16 +1,71 @@
+import atexit
 import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 
-logging.basicConfig(level=logging.DEBUG)
+import orjson
 
+from config.config import settings
 
-logger = logging.getLogger(name="logger")
 
-formatter = logging.Formatter(
-    fmt="%(levelname)s | %(name)s | %(module)s | %(funcName)s | %(message)s",
-)
+class JsonFormatter(logging.Formatter):
+    """Format record as one-line JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_record = {
+            "time": record.created,
+            "level": record.levelname,
+            "name": record.name,
+            "module": record.module,
+            "func": record.funcName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            log_record["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(log_record).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only given share of records below WARNING level"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+if settings.logging.json_format:
+    formatter: logging.Formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        fmt="%(levelname)s | %(name)s | %(module)s | %(funcName)s | %(message)s",
+    )
+
+# Records are put to queue on the event loop and written by listener thread
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
 stream_handler = logging.StreamHandler()
 stream_handler.setFormatter(formatter)
-stream_handler.setLevel(logging.DEBUG)
 
-logger.addHandler(stream_handler)
+queue_handler = QueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(settings.logging.sample_rate))
+
+queue_listener = QueueListener(log_queue, stream_handler)
+queue_listener.start()
+atexit.register(queue_listener.stop)
+
+logging.root.setLevel(settings.logging.level.upper())
+logging.root.addHandler(queue_handler)
+logging.getLogger("sqlalchemy.engine").setLevel(
+    logging.INFO if settings.logging.sql_echo else logging.WARNING
+)
+
+
+logger = logging.getLogger(name="logger")
+logger.addHandler(queue_handler)
 logger.propagate = False
@@ -0,0 +1,195 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Collector yields (name, type, help, [(labels, value)]) of metrics
+# computed at scrape time, like pool gauges
+Sample = tuple[dict[str, str], float]
+Collector = Callable[[], Iterable[tuple[str, str, str, list[Sample]]]]
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter per labels values.
+    Updated from event loop thread only, so it needs no locks.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield "{}{} {}".format(
+                self.name,
+                format_labels(dict(zip(self.labelnames, labels))),
+                format_value(value),
+            )
+
+
+class Histogram:
+    """
+    Cumulative histogram of observations per labels values.
+    Updated from event loop thread only, so it needs no locks.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per labels: counts per bucket with +Inf last, sum, count
+        self.values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, *labels)
+
+    def render(self) -> Iterator[str]:
+        for labels, (counts, total, count) in self.values.items():
+            labels_dict = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "{}_bucket{} {}".format(
+                    self.name,
+                    format_labels({**labels_dict, "le": format_value(bound)}),
+                    cumulative,
+                )
+            yield "{}_sum{} {}".format(
+                self.name, format_labels(labels_dict), format_value(total)
+            )
+            yield "{}_count{} {}".format(self.name, format_labels(labels_dict), count)
+
+
+class MetricsRegistry:
+    """Metrics rendered in Prometheus text exposition format"""
+
+    def __init__(self) -> None:
+        self.metrics: list[Counter | Histogram] = []
+        self.collectors: list[Collector] = []
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        metric = Counter(name, help, tuple(labelnames))
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames=(),
+        buckets: Optional[tuple[float, ...]] = None,
+    ) -> Histogram:
+        metric = Histogram(name, help, tuple(labelnames), buckets or DEFAULT_BUCKETS)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector) -> None:
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route",
+    ("method", "route", "status"),
+)
+password_hashing_duration = registry.histogram(
+    "password_hashing_duration_seconds",
+    "Time of password hashing including queue wait",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0),
+)
+token_encode_duration = registry.histogram(
+    "token_encode_duration_seconds",
+    "Time of access token signing",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+db_queries = registry.counter(
+    "db_queries_total",
+    "Statements executed on database",
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds",
+    "Time of statements execution on database",
+)
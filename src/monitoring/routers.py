@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from database.utils import get_pool_stats
+from monitoring.metrics import registry
+from monitoring.schemas import HealthSchema, PoolStatsSchema
+
+router = APIRouter(prefix="/health", tags=["Monitoring"])
+metrics_router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("", response_model=HealthSchema)
+async def get_health():
+    """Application is ready to serve requests"""
+
+    return HealthSchema(status="ok")
+
+
+@router.get("/pool", response_model=PoolStatsSchema)
+async def get_database_pool_stats():
+    """Get connection pool usage of database engine"""
+
+    return get_pool_stats()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Get metrics in Prometheus text exposition format"""
+
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class HealthSchema(BaseModel):
+    status: str
+
+
+class PoolStatsSchema(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    wait_count: int
+    wait_time_total: float
+    wait_time_max: float
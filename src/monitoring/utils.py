@@ -0,0 +1,139 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth.cache import token_cache
+from auth.emails import known_emails, missing_emails
+from auth.revocation import revocation_list
+from database.database import replica_set
+from database.utils import get_pool_stats
+from dto.users.utils import user_lookups
+from monitoring.metrics import (
+    db_queries,
+    db_query_duration,
+    http_request_duration,
+    registry,
+)
+
+
+class MetricsMiddleware:
+    """Observes latency of HTTP requests by route template"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Router puts matched route to scope, template keeps labels bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(
+                time.perf_counter() - started_at,
+                scope["method"],
+                route,
+                str(status_code),
+            )
+
+
+# Timer is kept on execution context, so failed statements leave nothing behind
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if context is not None:
+        context.query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    started_at = getattr(context, "query_started_at", None)
+    if started_at is None:
+        return
+    db_queries.inc()
+    db_query_duration.observe(time.perf_counter() - started_at)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count and time statements executed by engine"""
+
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def collect_pool_metrics():
+    pool_stats = get_pool_stats()
+    yield "db_pool_size", "gauge", "Size of connection pool", [({}, pool_stats.size)]
+    yield "db_pool_checked_out", "gauge", "Connections in use", [
+        ({}, pool_stats.checked_out)
+    ]
+    yield "db_pool_overflow", "gauge", "Connections over pool size", [
+        ({}, pool_stats.overflow)
+    ]
+    yield "db_pool_wait_seconds_total", "counter", "Time waited for connection", [
+        ({}, pool_stats.wait_time_total)
+    ]
+
+
+def collect_cache_metrics():
+    stats = token_cache.stats()
+    lookups = stats.hits + stats.misses
+    yield "token_cache_lookups_total", "counter", "Lookups of verified tokens", [
+        ({"result": "hit"}, stats.hits),
+        ({"result": "miss"}, stats.misses),
+    ]
+    yield "token_cache_hit_ratio", "gauge", "Share of token lookups hit", [
+        ({}, stats.hits / lookups if lookups else 0.0)
+    ]
+    yield "token_cache_entries", "gauge", "Cached verified tokens", [
+        ({}, stats.entries)
+    ]
+    yield "login_email_short_circuits_total", "counter", "Logins of missing emails", [
+        ({"source": "negative_cache"}, missing_emails.hits),
+        ({"source": "bloom"}, known_emails.hits),
+    ]
+    yield "revocation_bloom_hits_total", "counter", "Tokens checked in table", [
+        ({}, revocation_list.bloom_hits)
+    ]
+
+
+def collect_singleflight_metrics():
+    yield "singleflight_calls_total", "counter", "Lookups by who ran them", [
+        ({"name": user_lookups.name, "result": "executed"}, user_lookups.calls),
+        ({"name": user_lookups.name, "result": "coalesced"}, user_lookups.coalesced),
+    ]
+
+
+def collect_replica_metrics():
+    yield "db_replica_healthy", "gauge", "Replica serves reads", [
+        ({"replica": replica.name}, int(replica.healthy))
+        for replica in replica_set.replicas
+    ]
+    yield "db_replica_lag_seconds", "gauge", "Replication lag of replica", [
+        ({"replica": replica.name}, replica.lag)
+        for replica in replica_set.replicas
+        if replica.lag is not None
+    ]
+
+
+def setup_metrics(engine: AsyncEngine) -> None:
+    instrument_engine(engine)
+    for replica in replica_set.replicas:
+        instrument_engine(replica.engine)
+    registry.add_collector(collect_pool_metrics)
+    registry.add_collector(collect_cache_metrics)
+    registry.add_collector(collect_singleflight_metrics)
+    registry.add_collector(collect_replica_metrics)
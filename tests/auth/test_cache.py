@@ -0,0 +1,41 @@
+import time
+
+from auth.cache import TokenCache
+from config.config import TokenCacheConfig
+from dto.users.schemas import UserPrincipalSchema
+
+
+def make_principal(user_id: int) -> UserPrincipalSchema:
+    return UserPrincipalSchema(
+        id=user_id,
+        username=None,
+        email=f"user{user_id}@example.com",
+        roles=["user"],
+        is_active=True,
+    )
+
+
+def test_token_cache_evicts_least_recently_used():
+    """Test - cache keeps max_entries most recently used tokens"""
+
+    cache = TokenCache(TokenCacheConfig(max_entries=2))
+    for user_id in range(1, 4):
+        cache.set(f"token-{user_id}", {}, make_principal(user_id))
+
+    assert cache.get("token-1") is None
+    assert cache.get("token-3").principal.id == 3
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 1, 1)
+
+
+def test_token_cache_skips_expired_and_invalidated_tokens():
+    """Test - expired tokens and tokens of changed users are not served"""
+
+    cache = TokenCache(TokenCacheConfig())
+    cache.set("expired", {"exp": time.time() - 1}, make_principal(1))
+    cache.set("token", {"exp": time.time() + 60}, make_principal(2))
+    assert cache.get("expired") is None
+
+    cache.invalidate_user(2)
+    assert cache.get("token") is None
+    assert cache.stats().entries == 0
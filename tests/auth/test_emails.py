@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import update
+
+import auth.emails
+from auth.emails import KnownEmails, MissingEmailCache
+from config.config import EmailLookupConfig
+from core.bloom import BloomFilter
+from dao.models import User
+from tests.conftest import async_session
+
+
+def test_missing_email_cache_is_bounded():
+    """Test - cache keeps max_entries most recent missing emails"""
+
+    cache = MissingEmailCache(EmailLookupConfig(max_entries=2))
+    for number in range(3):
+        cache.add(f"user{number}@example.com")
+
+    assert "user0@example.com" not in cache
+    assert "user2@example.com" in cache
+    cache.discard("user2@example.com")
+    assert "user2@example.com" not in cache
+
+
+def test_known_emails_allow_any_email_until_built():
+    """Test - only emails missing from built filter are rejected"""
+
+    config = EmailLookupConfig(bloom_enabled=True)
+    known_emails = KnownEmails(config, MissingEmailCache(config))
+    assert "stranger@example.com" in known_emails
+
+    known_emails.bloom = BloomFilter(capacity=100, error_rate=0.001)
+    known_emails.add("user@example.com")
+    assert "user@example.com" in known_emails
+    assert "stranger@example.com" not in known_emails
+
+
+@pytest.fixture
+def known_emails(monkeypatch) -> KnownEmails:
+    monkeypatch.setattr(auth.emails, "async_session", async_session)
+    config = EmailLookupConfig(bloom_enabled=True, bloom_capacity=1000)
+    return KnownEmails(config, MissingEmailCache(config))
+
+
+async def test_sync_picks_up_emails_changed_by_other_workers(known_emails):
+    """Test - changed email is added to filter and dropped from missing"""
+
+    await known_emails.rebuild()
+    assert "changed@example.com" not in known_emails
+    known_emails.missing_emails.add("changed@example.com")
+
+    async with async_session() as session:
+        await session.execute(
+            update(User)
+            .where(User.email == "user@example.com")
+            .values(email="changed@example.com")
+        )
+        await session.commit()
+    try:
+        await known_emails.sync()
+        assert "changed@example.com" in known_emails
+        assert "changed@example.com" not in known_emails.missing_emails
+    finally:
+        async with async_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.email == "changed@example.com")
+                .values(email="user@example.com")
+            )
+            await session.commit()
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from passlib.context import CryptContext
+
+from auth.hashing import (
+    HashingExecutor,
+    HashingPoolSaturatedError,
+    calibrate_pwd_policy,
+)
+from config.config import HashingConfig
+
+
+async def test_hashing_pool_rejects_jobs_when_saturated():
+    """Test - jobs above workers + queue depth are rejected"""
+
+    executor = HashingExecutor(
+        HashingConfig(max_workers=1, max_queue_depth=1),
+    )
+    jobs = [asyncio.create_task(executor.run(time.sleep, 0.2)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(HashingPoolSaturatedError):
+        await executor.run(time.sleep, 0)
+    await asyncio.gather(*jobs)
+    assert executor.pending == 0
+    executor.shutdown()
+
+
+async def test_single_job_gets_worker_during_batch():
+    """Test - batches share slots below max_workers, login does not wait"""
+
+    executor = HashingExecutor(HashingConfig(max_workers=2, reserved_workers=1))
+    batches = [
+        asyncio.create_task(executor.run_many(time.sleep, [(0.2,)] * 2))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0.05)
+    assert executor.pending == 1
+
+    started_at = time.perf_counter()
+    await executor.run(time.sleep, 0)
+    assert time.perf_counter() - started_at < 0.1
+    await asyncio.gather(*batches)
+    executor.shutdown()
+
+
+def test_hashing_policy_is_calibrated_to_target_time():
+    """Test - calibrated cost stays in bounds and old hashes need update"""
+
+    config = HashingConfig(
+        target_ms=10_000,
+        bcrypt_min_rounds=4,
+        bcrypt_max_rounds=5,
+    )
+    policy = calibrate_pwd_policy(config)
+    assert policy["bcrypt__rounds"] == 5
+
+    context = CryptContext(**policy)
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password")
+    assert context.needs_update(old_hash)
+    assert not context.needs_update(context.hash("password"))
@@ -0,0 +1,67 @@
+import jwt
+import orjson
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.exceptions import InvalidTokenError
+
+from auth.keys import KeyRing
+from config.config import AuthData
+
+
+def write_private_key(path, key):
+    path.write_bytes(
+        key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+
+
+def write_public_key(path, key):
+    path.write_bytes(
+        key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+
+
+def test_key_ring_verifies_tokens_of_retired_keys(tmp_path):
+    """Test - token signed by retired key is valid, new ones use active key"""
+
+    old_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    new_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    write_private_key(tmp_path / "2024-01.pem", old_key)
+    old_token = KeyRing(
+        AuthData(secret_key="unused", algorithm="RS256", keys_dir=tmp_path),
+    ).encode({"sub": "user@example.com"})
+
+    (tmp_path / "2024-01.pem").unlink()
+    write_public_key(tmp_path / "2024-01.pub.pem", old_key)
+    write_private_key(tmp_path / "2024-02.pem", new_key)
+    key_ring = KeyRing(
+        AuthData(secret_key="unused", algorithm="RS256", keys_dir=tmp_path),
+    )
+
+    assert key_ring.decode(old_token)["sub"] == "user@example.com"
+    new_token = key_ring.encode({"sub": "user@example.com"})
+    assert jwt.get_unverified_header(new_token)["kid"] == "2024-02"
+    jwks = orjson.loads(key_ring.jwks)
+    assert {jwk["kid"] for jwk in jwks["keys"]} == {"2024-01", "2024-02"}
+
+
+def test_key_ring_rejects_unknown_key_id(tmp_path):
+    """Test - token with unknown kid is invalid"""
+
+    write_private_key(
+        tmp_path / "signing.pem",
+        ed25519.Ed25519PrivateKey.generate(),
+    )
+    key_ring = KeyRing(
+        AuthData(secret_key="unused", algorithm="EdDSA", keys_dir=tmp_path),
+    )
+    token = jwt.encode({"sub": "x"}, "secret", headers={"kid": "other"})
+    with pytest.raises(InvalidTokenError):
+        key_ring.decode(token)
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, select
+
+import auth.revocation
+from auth.revocation import RevocationList
+from config.config import RevocationConfig
+from dao.models import RefreshToken, RevokedToken
+from tests.conftest import async_session
+
+
+@pytest.fixture
+def revocation_list(monkeypatch) -> RevocationList:
+    monkeypatch.setattr(auth.revocation, "async_session", async_session)
+    return RevocationList(RevocationConfig(bloom_capacity=1000))
+
+
+async def test_rebuild_purges_expired_refresh_tokens(revocation_list):
+    """Test - expired refresh tokens are deleted, others are kept"""
+
+    now = datetime.now(timezone.utc)
+    async with async_session() as session:
+        session.add_all(
+            RefreshToken(
+                token_hash=token_hash,
+                family_id="family",
+                user_id=1,
+                expires_at=now + timedelta(days=days),
+                revoked=True,
+            )
+            for token_hash, days in (("expired", -1), ("valid", 1))
+        )
+        await session.commit()
+
+    await revocation_list.rebuild()
+
+    async with async_session() as session:
+        token_hashes = await session.scalars(
+            select(RefreshToken.token_hash).where(RefreshToken.family_id == "family")
+        )
+        assert token_hashes.all() == ["valid"]
+        await session.execute(
+            delete(RefreshToken).where(RefreshToken.family_id == "family")
+        )
+        await session.commit()
+
+
+async def test_rebuild_keeps_live_filter_while_loading(revocation_list, monkeypatch):
+    """Test - revoked keys are found while new filter is loading"""
+
+    revocation_list.bloom.add("jti:revoked")
+    load = revocation_list._load
+
+    async def load_and_check(bloom, since):
+        assert "jti:revoked" in revocation_list.bloom
+        return await load(bloom, since)
+
+    monkeypatch.setattr(revocation_list, "_load", load_and_check)
+    await revocation_list.rebuild()
+
+
+async def test_sync_loads_keys_committed_after_previous_sync(revocation_list):
+    """Test - key revoked before sync but committed after it is loaded"""
+
+    await revocation_list.sync()
+    now = datetime.now(timezone.utc)
+    async with async_session() as session:
+        session.add(
+            RevokedToken(
+                key="jti:late",
+                revoked_at=revocation_list.synced_at - timedelta(seconds=1),
+                expires_at=now + timedelta(minutes=1),
+            )
+        )
+        await session.commit()
+
+    await revocation_list.sync()
+    assert "jti:late" in revocation_list.bloom
+
+    async with async_session() as session:
+        await session.execute(
+            delete(RevokedToken).where(RevokedToken.key == "jti:late")
+        )
+        await session.commit()
@@ -1,4 +1,3 @@
-from asyncio import current_task
 from typing import AsyncGenerator, AsyncIterator
 
 import pytest
@@ -7,11 +6,10 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
     AsyncSession,
-    async_scoped_session,
 )
 from httpx import AsyncClient, ASGITransport
 
-from src.database.database import get_session, get_scoped_session
+from database.database import get_session
 from src.dao.base_model import metadata
 from src.dao.models import Password, User  # noqa
 from src.config.config import settings
@@ -32,11 +30,6 @@ async_session = async_sessionmaker(
     expire_on_commit=False,
 )
 
-scoped_session = async_scoped_session(
-    session_factory=async_session,
-    scopefunc=current_task,
-)
-
 metadata.bind = engine_test
 
 
@@ -45,11 +38,6 @@ async def override_get_async_session() -> AsyncIterator[AsyncSession]:
         yield session
 
 
-async def override_get_scoped_session() -> AsyncIterator[AsyncSession]:
-    async with scoped_session() as session:
-        yield session
-
-
 password = Password(
     hashed_password="$2b$12$aToTBlTJQXc4np906GD9KO2ckSvVO5dj3x9ZxAi58MxVFa7wOaBmO",
 )
@@ -91,7 +79,6 @@ def app():
 
     _app = create_app()
     _app.dependency_overrides[get_session] = override_get_async_session
-    _app.dependency_overrides[get_scoped_session] = override_get_scoped_session
     yield _app
 
 
@@ -0,0 +1,16 @@
+from core.bloom import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test - added keys are always found, others rarely"""
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for number in range(1000):
+        bloom.add(f"jti:{number}")
+
+    assert all(f"jti:{number}" in bloom for number in range(1000))
+    false_positives = sum(f"user:{number}" in bloom for number in range(1000))
+    assert false_positives < 50
+
+    bloom.clear()
+    assert "jti:1" not in bloom
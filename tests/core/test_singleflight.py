@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_call():
+    """Test - callers with the same key get result of one call"""
+
+    single_flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(single_flight.do("key", fetch) for _ in range(10)))
+    assert results == [1] * 10
+    assert (single_flight.calls, single_flight.coalesced) == (1, 9)
+
+    async def fail():
+        raise LookupError
+
+    with pytest.raises(LookupError):
+        await single_flight.do("key", fail)
+
+
+async def test_waiter_runs_call_if_first_caller_is_cancelled():
+    """Test - cancelled first caller does not fail waiting callers"""
+
+    single_flight = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "user"
+
+    first = asyncio.create_task(single_flight.do("key", fetch))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(single_flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "user"
+    assert first.cancelled()
@@ -0,0 +1,53 @@
+from sqlalchemy import NullPool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database.replicas
+from config.config import ReplicaConfig, settings
+from database.replicas import ReplicaSet
+
+
+def make_engine(url: str):
+    return create_async_engine(url=url, poolclass=NullPool)
+
+
+async def test_replicas_are_picked_round_robin():
+    """Test - healthy replicas take turns, test database stands in for them"""
+
+    replica_set = ReplicaSet(
+        ReplicaConfig(urls=[settings.db.url, settings.db.url]), make_engine
+    )
+    await replica_set.check()
+    first, second = (replica.engine for replica in replica_set.replicas)
+    assert [replica_set.pick() for _ in range(4)] == [first, second] * 2
+    assert all(replica.lag == 0 for replica in replica_set.replicas)
+    await replica_set.stop()
+
+
+async def test_unhealthy_replicas_are_skipped():
+    """Test - unreachable and lagging replicas are not picked"""
+
+    unreachable_url = settings.db.url.replace(
+        f"@{settings.db.host}:{settings.db.port}/", f"@{settings.db.host}:1/"
+    )
+    replica_set = ReplicaSet(
+        ReplicaConfig(urls=[unreachable_url, settings.db.url]), make_engine
+    )
+    await replica_set.check()
+    unreachable, reachable = replica_set.replicas
+    assert not unreachable.healthy
+    assert replica_set.pick() is reachable.engine
+
+    replica_set.config.max_lag_seconds = -1
+    await replica_set.check()
+    assert replica_set.pick() is None
+    await replica_set.stop()
+
+
+async def test_replica_not_streaming_wal_is_skipped(monkeypatch):
+    """Test - replica without WAL receiver is unhealthy whatever its LSNs"""
+
+    monkeypatch.setattr(database.replicas, "LAG_QUERY", text("SELECT NULL"))
+    replica_set = ReplicaSet(ReplicaConfig(urls=[settings.db.url]), make_engine)
+    await replica_set.check()
+    assert replica_set.pick() is None
+    await replica_set.stop()
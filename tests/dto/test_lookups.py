@@ -0,0 +1,26 @@
+import asyncio
+
+from sqlalchemy import NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from config.config import settings
+from dto.users.utils import load_principal_by_id, user_lookups
+from tests.conftest import engine_test
+
+
+async def test_lookups_on_other_engines_are_not_coalesced():
+    """Test - lookup on primary does not share query running on replica"""
+
+    replica = create_async_engine(url=settings.db.url, poolclass=NullPool)
+    calls_before = user_lookups.calls
+    async with (
+        AsyncSession(bind=engine_test) as primary_session,
+        AsyncSession(bind=replica) as replica_session,
+    ):
+        principals = await asyncio.gather(
+            load_principal_by_id(primary_session, 1),
+            load_principal_by_id(replica_session, 1),
+        )
+    await replica.dispose()
+    assert [principal.id for principal in principals] == [1, 1]
+    assert user_lookups.calls - calls_before == 2
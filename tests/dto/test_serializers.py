@@ -0,0 +1,23 @@
+import orjson
+from pydantic import TypeAdapter
+
+from dao.models import Role
+from dto.users.schemas import UserOutSchema
+from dto.users.serializers import dump_user_row_line, dump_user_rows
+
+rows = [
+    ("Alice", "alice@example.com", [Role.admin, Role.user], 1, True),
+    (None, "bob@example.com", [], 2, False),
+]
+
+
+def test_user_rows_are_dumped_as_response_model():
+    """Test - fast path gives same JSON as validation by response model"""
+
+    adapter = TypeAdapter(list[UserOutSchema])
+    users = adapter.validate_python(
+        [dict(zip(UserOutSchema.model_fields, row)) for row in rows]
+    )
+
+    assert orjson.loads(dump_user_rows(rows)) == adapter.dump_python(users, mode="json")
+    assert dump_user_row_line(rows[1]).endswith(b"\n")
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from config.config import RateLimitConfig
+from limiter.stores import TOKEN_BUCKET_SCRIPT, InMemoryStore, RedisStore, take_token
+from limiter.utils import LoginRateLimiter
+
+
+class FakeRedis:
+    """Runs Python twin of token bucket script on dict instead of Redis server"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def eval(self, script, numkeys, key, now, interval, period):
+        tat = self.data.get(key)
+        new_tat, retry_after = take_token(
+            None if tat is None else float(tat),
+            float(now),
+            round(float(period) / float(interval)),
+            float(period),
+        )
+        if retry_after == 0:
+            self.data[key] = repr(new_tat).encode()
+        return repr(retry_after).encode()
+
+
+class LuaRedis:
+    """Runs token bucket script in Lua with GET and SET of dict"""
+
+    def __init__(self):
+        lupa = pytest.importorskip("lupa")
+        self.lua = lupa.LuaRuntime()
+        self.data = {}
+        self.lua.globals().redis = self.lua.table_from({"call": self.call})
+
+    def call(self, command, key, *args):
+        if command == "GET":
+            return self.data.get(key, False)
+        self.data[key] = args[0]
+        return True
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        self.lua.globals().KEYS = self.lua.table_from(keys_and_args[:numkeys])
+        self.lua.globals().ARGV = self.lua.table_from(keys_and_args[numkeys:])
+        return self.lua.execute(script)
+
+
+def test_token_bucket_allows_burst_then_refills():
+    """Test - limit requests pass at once, next one waits one interval"""
+
+    tat = None
+    for _ in range(3):
+        tat, retry_after = take_token(tat, 100.0, limit=3, period=60)
+        assert retry_after == 0
+    _, retry_after = take_token(tat, 100.0, limit=3, period=60)
+    assert retry_after == 20
+    _, retry_after = take_token(tat, 120.0, limit=3, period=60)
+    assert retry_after == 0
+
+
+async def test_in_memory_store_limits_and_sweeps_keys():
+    """Test - store rejects over limit and drops refilled buckets"""
+
+    store = InMemoryStore(shards=2)
+    assert await store.take("user:bob", 1, 0.05) == 0
+    assert await store.take("user:bob", 1, 0.05) > 0
+    assert await store.take("user:alice", 1, 0.05) == 0
+
+    time.sleep(0.06)
+    await store.sweep()
+    await store.sweep()
+    assert len(store) == 0
+
+
+async def test_redis_store_limits_with_shared_client():
+    """Test - two stores on one client share buckets"""
+
+    client = FakeRedis()
+    first_worker, second_worker = RedisStore(client), RedisStore(client)
+    assert await first_worker.take("ip:1.1.1.1", 2, 60) == 0
+    assert await second_worker.take("ip:1.1.1.1", 2, 60) == 0
+    assert await first_worker.take("ip:1.1.1.1", 2, 60) > 0
+
+
+async def test_redis_store_script_matches_take_token():
+    """Test - Lua script and take_token give the same waits"""
+
+    client = LuaRedis()
+    for now in (100.0, 100.0, 100.0, 100.0, 110.0, 120.0, 120.0):
+        tat = client.data.get("key")
+        expected = take_token(
+            None if tat is None else float(tat), now, limit=3, period=60
+        )[1]
+        retry_after = await client.eval(
+            TOKEN_BUCKET_SCRIPT, 1, "key", repr(now), repr(20.0), repr(60.0)
+        )
+        assert float(retry_after) == pytest.approx(expected)
+
+
+def test_client_ip_is_taken_from_trusted_proxies_only():
+    """Test - forwarded ip is used behind trusted proxy and not spoofable"""
+
+    limiter = LoginRateLimiter(RateLimitConfig(trusted_proxies=["10.0.0.0/8"]))
+    forwarded_for = "6.6.6.6, 1.2.3.4, 10.0.0.2"
+    assert limiter.client_ip("10.0.0.1", forwarded_for) == "1.2.3.4"
+    assert limiter.client_ip("1.2.3.4", forwarded_for) == "1.2.3.4"
+    assert limiter.client_ip("10.0.0.1", None) == "10.0.0.1"
+
+
+async def test_blocked_ip_does_not_drain_username_bucket():
+    """Test - requests rejected by ip limit do not lock user out"""
+
+    limiter = LoginRateLimiter(RateLimitConfig(ip_limit=1, username_limit=2))
+    assert await limiter.check("6.6.6.6", "bob@example.com") == 0
+    for _ in range(3):
+        assert await limiter.check("6.6.6.6", "bob@example.com") > 0
+    assert await limiter.check("1.2.3.4", "bob@example.com") == 0
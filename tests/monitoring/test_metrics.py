@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from monitoring.metrics import MetricsRegistry, db_queries
+from monitoring.utils import instrument_engine
+from tests.conftest import engine_test
+
+
+def test_histogram_is_rendered_cumulative():
+    """Test - buckets of histogram count observations up to their bound"""
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "duration_seconds", "Duration", ("route",), buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/token")
+
+    lines = registry.render().splitlines()
+    assert 'duration_seconds_bucket{route="/token",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{route="/token",le="1.0"} 2' in lines
+    assert 'duration_seconds_bucket{route="/token",le="+Inf"} 3' in lines
+    assert 'duration_seconds_count{route="/token"} 3' in lines
+
+
+async def test_failed_statements_are_not_counted():
+    """Test - failed statement is skipped and next one is timed"""
+
+    instrument_engine(engine_test)
+    queries_before = db_queries.values.get((), 0)
+    async with engine_test.connect() as connection:
+        with pytest.raises(DBAPIError):
+            await connection.execute(text("SELECT 1 / 0"))
+        await connection.rollback()
+        await connection.execute(text("SELECT 1"))
+    assert db_queries.values[()] == queries_before + 1
@@ -1,7 +1,13 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import NullPool
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+import database.database
+from config.config import settings
+from database.database import get_session
 
 
 @pytest.fixture(scope="class")
@@ -31,3 +37,40 @@ async def new_user():
         "roles": ["user"],
         "password": "0987654321",
     }
+
+
+class StubReplicas:
+    """Stands in for replica set, every pick gives the same bind"""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.picks = 0
+
+    def pick(self):
+        self.picks += 1
+        return self.bind
+
+    def is_replica(self, bind) -> bool:
+        return bind is not None and bind is self.bind
+
+
+@pytest.fixture
+async def primary_engine(app, monkeypatch) -> AsyncIterator[AsyncEngine]:
+    """Sessions are routed by real get_session, primary is own engine"""
+
+    engine = create_async_engine(url=settings.db.url, poolclass=NullPool)
+    monkeypatch.setattr(database.database, "engine", engine)
+    monkeypatch.delitem(app.dependency_overrides, get_session)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def replicas(primary_engine, monkeypatch) -> AsyncIterator[StubReplicas]:
+    """Replica stand-in on test database"""
+
+    engine = create_async_engine(url=settings.db.url, poolclass=NullPool)
+    stub_replicas = StubReplicas(engine)
+    monkeypatch.setattr(database.database, "replica_set", stub_replicas)
+    yield stub_replicas
+    await engine.dispose()
@@ -1,13 +1,21 @@
+import asyncio
+import json
+import time
 from typing import Optional
 
 from httpx import AsyncClient
-from sqlalchemy import select
+from sqlalchemy import NullPool, event, func, select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import Pool
 
-from src.dao.models import User
+import database.database
+from config.config import settings
+from src.dao.models import Password, User
 from tests.conftest import (
     async_client,
     async_session,
 )
+from tests.routes.conftest import StubReplicas
 
 
 async def test_can_get_api_version(async_client: AsyncClient):
@@ -18,6 +26,211 @@ async def test_can_get_api_version(async_client: AsyncClient):
     assert response.status_code == 200, f"Url {url} not reachable"
 
 
+async def test_can_get_database_pool_stats(async_client: AsyncClient):
+    """Test - client can get database pool usage"""
+
+    url = "/health/pool"
+    response = await async_client.get(url)
+    assert response.status_code == 200
+    assert response.json()["checked_out"] >= 0
+
+
+async def test_can_get_metrics(async_client: AsyncClient):
+    """Test - client can get metrics in text exposition format"""
+
+    await async_client.get("/api")
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/api"' in response.text
+    assert "db_pool_checked_out" in response.text
+
+
+async def test_request_checks_out_one_connection(
+    async_client: AsyncClient,
+    auth_data,
+    monkeypatch,
+):
+    """Test - route and its auth dependency share one session and connection"""
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    # Claims are not trusted, so auth dependency loads user from database
+    monkeypatch.setattr(settings.auth, "claims_max_age_seconds", -1)
+
+    checkouts = []
+
+    def listener(dbapi_connection, connection_record, connection_proxy):
+        checkouts.append(connection_record)
+
+    event.listen(Pool, "checkout", listener)
+    try:
+        response = await async_client.get("/api/users", headers=headers)
+    finally:
+        event.remove(Pool, "checkout", listener)
+    assert response.status_code == 200
+    assert len(checkouts) == 1
+
+
+async def test_can_not_get_profile_by_token_cached_from_claims(
+    async_client: AsyncClient,
+    auth_data,
+):
+    """Test - profile checks database even if token was cached from claims"""
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    # Route trusting claims caches principal built from them
+    response = await async_client.get("/api/users", headers=headers)
+    assert response.status_code == 200
+
+    async with async_session() as session:
+        await session.execute(
+            update(User)
+            .where(User.email == auth_data["username"])
+            .values(token_version=User.token_version + 1)
+        )
+        await session.commit()
+    try:
+        response = await async_client.get("/api/users/me", headers=headers)
+        assert response.status_code == 401
+    finally:
+        async with async_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.email == auth_data["username"])
+                .values(token_version=User.token_version - 1)
+            )
+            await session.commit()
+
+
+async def test_can_get_cached_jwks(async_client: AsyncClient):
+    """Test - client can get key set and revalidate it with ETag"""
+
+    url = "/.well-known/jwks.json"
+    response = await async_client.get(url)
+    assert response.status_code == 200
+    assert "keys" in response.json()
+    assert "max-age" in response.headers["Cache-Control"]
+
+    response = await async_client.get(
+        url, headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+async def test_can_refresh_token_once(async_client: AsyncClient, auth_data):
+    """Test - refresh token is rotated and its reuse revokes the family"""
+
+    url = "/token"
+    response = await async_client.post(url, data=auth_data)
+    assert response.status_code == 200
+    first_refresh_token = response.json()["refresh_token"]
+
+    refresh_data = {
+        "grant_type": "refresh_token",
+        "refresh_token": first_refresh_token,
+    }
+    response = await async_client.post(url, data=refresh_data)
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+    second_refresh_token = response.json()["refresh_token"]
+    assert second_refresh_token != first_refresh_token
+
+    response = await async_client.post(url, data=refresh_data)
+    assert response.status_code == 400
+
+    refresh_data["refresh_token"] = second_refresh_token
+    response = await async_client.post(url, data=refresh_data)
+    assert response.status_code == 400
+
+
+async def test_can_not_use_token_after_logout(async_client: AsyncClient, auth_data):
+    """Test - revoked token is rejected while other tokens are valid"""
+
+    tokens = []
+    for _ in range(2):
+        response = await async_client.post("/token", data=auth_data)
+        tokens.append(response.json()["access_token"])
+    first_headers, second_headers = (
+        dict(Authorization="Bearer {}".format(token)) for token in tokens
+    )
+
+    response = await async_client.get("/api/users/me", headers=first_headers)
+    assert response.status_code == 200
+
+    response = await async_client.post("/logout", headers=first_headers)
+    assert response.status_code == 204
+
+    response = await async_client.get("/api/users/me", headers=first_headers)
+    assert response.status_code == 401
+    response = await async_client.get("/api/users/me", headers=second_headers)
+    assert response.status_code == 200
+
+
+async def test_can_login_right_after_sign_out(async_client: AsyncClient, auth_data):
+    """Test - token issued in the same second after sign-out is valid"""
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    user_id = (await async_client.get("/api/users/me", headers=headers)).json()["id"]
+    # Start of second, so sign-out and login likely share whole second of iat
+    await asyncio.sleep(1 - time.time() % 1)
+    response = await async_client.post(
+        f"/api/users/{user_id}/sign-out", headers=headers
+    )
+    assert response.status_code == 204
+
+    response = await async_client.post("/token", data=auth_data)
+    new_headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    response = await async_client.get("/api/users/me", headers=new_headers)
+    assert response.status_code == 200
+    response = await async_client.get("/api/users/me", headers=headers)
+    assert response.status_code == 401
+
+
+async def test_can_introspect_tokens(async_client: AsyncClient, auth_data):
+    """Test - admin can check batch of tokens in one request"""
+
+    response = await async_client.post("/token", data=auth_data)
+    token = response.json()["access_token"]
+    headers = dict(Authorization="Bearer {}".format(token))
+
+    response = await async_client.post(
+        "/token/introspect",
+        json={"tokens": [token, "not-a-token"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    active, inactive = response.json()["results"]
+    assert active["active"] is True
+    assert active["sub"] == auth_data["username"]
+    assert inactive == {"active": False}
+    max_age = int(response.headers["Cache-Control"].split("max-age=")[1])
+    assert 0 < max_age <= settings.auth.introspection_max_age_seconds
+
+
+async def test_can_not_login_too_often(async_client: AsyncClient):
+    """Test - login attempts over username limit are rejected"""
+
+    url = "/token"
+    auth_data = {"username": "stranger@example.com", "password": "wrong"}
+    for _ in range(settings.rate_limit.username_limit):
+        response = await async_client.post(url, data=auth_data)
+        assert response.status_code == 400
+    response = await async_client.post(url, data=auth_data)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
 class TestUsers:
     """Tests for all users endpoints"""
 
@@ -58,6 +271,75 @@ class TestUsers:
         response = await async_client.get(url, headers=headers)
         assert response.status_code == 200
 
+    @classmethod
+    async def test_can_get_users_page_by_cursor(
+            cls,
+            async_client: AsyncClient,
+            login,
+    ):
+        """Test - client can walk users pages with next cursor"""
+
+        url = "/api/users"
+        headers = dict(
+            Authorization="Bearer {}".format(login),
+        )
+        response = await async_client.get(
+            url, params={"limit": 1}, headers=headers
+        )
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = await async_client.get(
+            url, params={"limit": 1, "cursor": cursor}, headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+
+    @classmethod
+    async def test_can_filter_users(
+            cls,
+            async_client: AsyncClient,
+            login,
+    ):
+        """Test - client can filter users by role, status and prefix"""
+
+        url = "/api/users"
+        headers = dict(
+            Authorization="Bearer {}".format(login),
+        )
+        params = {"role": "admin", "is_active": True, "email_prefix": "USER@"}
+        response = await async_client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        assert [user["email"] for user in response.json()] == ["user@example.com"]
+
+        response = await async_client.get(
+            url, params={"username_prefix": "%"}, headers=headers
+        )
+        assert response.status_code == 404
+
+    @classmethod
+    async def test_can_stream_all_users(
+            cls,
+            async_client: AsyncClient,
+            login,
+    ):
+        """Test - client can get all users as NDJSON stream"""
+
+        url = "/api/users"
+        headers = dict(
+            Authorization="Bearer {}".format(login),
+        )
+        response = await async_client.get(
+            url, params={"stream": True}, headers=headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])["email"] == "user@example.com"
+
     @classmethod
     async def test_can_add_new_user_to_db(
             cls,
@@ -83,6 +365,68 @@ class TestUsers:
             user_count_after = await cls.fetch_users_count(session)
             assert user_count_after - user_count_before == 1
 
+    @classmethod
+    async def test_can_not_add_user_with_existing_email(
+            cls,
+            async_client: AsyncClient,
+            new_user,
+            login,
+    ):
+        """Test client gets conflict and no rows are left for duplicate"""
+
+        async with async_session() as session:
+            passwords_count_before = await session.scalar(
+                select(func.count()).select_from(Password)
+            )
+            headers = dict(
+                Authorization="Bearer {}".format(login),
+            )
+            response = await async_client.post(
+                "/api/users",
+                json=new_user,
+                headers=headers,
+            )
+            assert response.status_code == 409
+            passwords_count_after = await session.scalar(
+                select(func.count()).select_from(Password)
+            )
+            assert passwords_count_after == passwords_count_before
+
+    @classmethod
+    async def test_can_not_use_token_after_user_update(
+            cls,
+            async_client: AsyncClient,
+            new_user,
+            login,
+    ):
+        """Test - token issued before user update is not valid for profile"""
+
+        response = await async_client.post(
+            "/token",
+            data={
+                "username": new_user["email"],
+                "password": new_user["password"],
+            },
+        )
+        user_headers = dict(
+            Authorization="Bearer {}".format(response.json()["access_token"]),
+        )
+        response = await async_client.get("/api/users/me", headers=user_headers)
+        assert response.status_code == 200
+
+        admin_headers = dict(
+            Authorization="Bearer {}".format(login),
+        )
+        response = await async_client.patch(
+            "/api/users/{}".format(response.json()["id"]),
+            json={"username": "Bobby"},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200
+
+        response = await async_client.get("/api/users/me", headers=user_headers)
+        assert response.status_code == 401
+
     @classmethod
     async def test_can_get_user_by_id(
             cls,
@@ -118,3 +462,211 @@ class TestUsers:
             assert response.json().get("deleted") is True
             user_count_after = await cls.fetch_users_count(session)
             assert user_count_before - user_count_after == 1
+
+    @classmethod
+    async def test_can_add_many_users_to_db(
+            cls,
+            async_client: AsyncClient,
+            login,
+    ):
+        """Test client can add many users with one request"""
+
+        url = "/api/users/bulk"
+        headers = dict(
+            Authorization="Bearer {}".format(login),
+        )
+        users = [
+            {
+                "username": "Carol",
+                "email": "carol@example.com",
+                "roles": ["user"],
+                "password": "0987654321",
+            },
+            {
+                "username": "Copy",
+                "email": "user@example.com",
+                "roles": ["user"],
+                "password": "0987654321",
+            },
+            {"email": "not-an-email"},
+        ]
+        response = await async_client.post(url, json=users, headers=headers)
+        assert response.status_code == 200
+        report = response.json()
+        assert report["created"] == 1
+        assert [result["status"] for result in report["results"]] == [
+            "created",
+            "duplicate",
+            "invalid",
+        ]
+
+        csv_body = (
+            "username,email,roles,password\n"
+            "Dave,dave@example.com,user;teacher,0987654321\n"
+        )
+        response = await async_client.post(
+            url,
+            content=csv_body,
+            headers={**headers, "Content-type": "text/csv"},
+        )
+        assert response.status_code == 200
+        assert response.json()["results"][0]["status"] == "created"
+
+        response = await async_client.post(
+            url,
+            content=b"\xff\xfe\n",
+            headers={**headers, "Content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        assert response.json()["results"][0]["status"] == "invalid"
+
+    @classmethod
+    async def test_can_not_add_too_many_users(
+            cls,
+            async_client: AsyncClient,
+            login,
+            monkeypatch,
+    ):
+        """Test client gets 413 and only rows up to limit are imported"""
+
+        monkeypatch.setattr(settings.bulk_import, "max_rows", 1)
+        async with async_session() as session:
+            user_count_before = await cls.fetch_users_count(session)
+            headers = dict(
+                Authorization="Bearer {}".format(login),
+                **{"Content-type": "application/x-ndjson"},
+            )
+            body = "".join(
+                json.dumps(
+                    {
+                        "username": name,
+                        "email": f"{name.lower()}@example.com",
+                        "roles": ["user"],
+                        "password": "0987654321",
+                    }
+                )
+                + "\n"
+                for name in ("Erin", "Frank")
+            )
+            response = await async_client.post(
+                "/api/users/bulk",
+                content=body,
+                headers=headers,
+            )
+            assert response.status_code == 413
+            report = response.json()
+            assert report["rows_limit_exceeded"] is True
+            assert [result["email"] for result in report["results"]] == [
+                "erin@example.com"
+            ]
+            user_count_after = await cls.fetch_users_count(session)
+            assert user_count_after - user_count_before == 1
+
+
+def record_statements(engine, name: str, log: list) -> None:
+    def listener(conn, cursor, statement, parameters, context, many):
+        log.append(name)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+
+
+async def test_reads_are_routed_to_replica(
+    async_client: AsyncClient,
+    auth_data,
+    primary_engine,
+    replicas,
+):
+    """Test - GET requests are bound to replica, others to primary"""
+
+    log = []
+    record_statements(primary_engine, "primary", log)
+    record_statements(replicas.bind, "replica", log)
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    assert replicas.picks == 0
+    assert set(log) == {"primary"}
+
+    for url in ("/api/users", "/api/users/me", "/api/users/1"):
+        picks, log[:] = replicas.picks, []
+        response = await async_client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert replicas.picks == picks + 1
+        if url != "/api/users/me":
+            assert "replica" in log
+
+    picks, log[:] = replicas.picks, []
+    response = await async_client.post(
+        "/api/users",
+        json={
+            "username": "Grace",
+            "email": "grace@example.com",
+            "roles": ["user"],
+            "password": "0987654321",
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201
+    url = "/api/users/{}".format(response.json()["id"])
+    response = await async_client.patch(
+        url, json={"username": "Gracie"}, headers=headers
+    )
+    assert response.status_code == 200
+    response = await async_client.delete(url, headers=headers)
+    assert response.status_code == 200
+    assert replicas.picks == picks
+    assert set(log) == {"primary"}
+
+
+async def test_reads_fall_back_to_primary(
+    async_client: AsyncClient,
+    auth_data,
+    primary_engine,
+    monkeypatch,
+):
+    """Test - GET requests use primary when no replica is healthy"""
+
+    monkeypatch.setattr(database.database, "replica_set", StubReplicas(None))
+    log = []
+    record_statements(primary_engine, "primary", log)
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    log[:] = []
+    response = await async_client.get("/api/users", headers=headers)
+    assert response.status_code == 200
+    assert "primary" in log
+
+
+async def test_revoked_token_is_rejected_on_lagging_replica(
+    async_client: AsyncClient,
+    auth_data,
+    primary_engine,
+    monkeypatch,
+):
+    """Test - GET checks revocation on primary, not on stale replica"""
+
+    response = await async_client.post("/token", data=auth_data)
+    headers = dict(
+        Authorization="Bearer {}".format(response.json()["access_token"]),
+    )
+    replica = create_async_engine(url=settings.db.url, poolclass=NullPool)
+    # Snapshot taken before logout stands in for lagging replica
+    async with replica.connect() as snapshot:
+        await snapshot.execution_options(isolation_level="REPEATABLE READ")
+        await snapshot.begin()
+        await snapshot.execute(text("SELECT count(*) FROM revoked_tokens"))
+        monkeypatch.setattr(database.database, "replica_set", StubReplicas(snapshot))
+
+        response = await async_client.get("/api/users/me", headers=headers)
+        assert response.status_code == 200
+        response = await async_client.post("/logout", headers=headers)
+        assert response.status_code == 204
+        response = await async_client.get("/api/users/me", headers=headers)
+        assert response.status_code == 401
+        await snapshot.rollback()
+    await replica.dispose()